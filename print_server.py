@@ -3,34 +3,120 @@
 FriendlyPOS Print Server - Teltonika RUT956 Edition
 """
 
+import binascii
+import heapq
+import itertools
 import json
+import select
 import socket
 import time
-import urllib.request
-import urllib.error
 import sys
 import os
 import logging
+import random
+import re
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Any
+
+# Smaller defaults for routers with only a few MB of RAM to spare
+LOW_FOOTPRINT = os.getenv('LOW_FOOTPRINT', '0') == '1'
 
 CONFIG = {
     'api_url': os.getenv('API_URL', 'https://your-app.vercel.app'),
     'api_key': os.getenv('API_KEY', ''),
     'event_id': os.getenv('EVENT_ID', ''),
+    'event_ids': os.getenv('EVENT_IDS', ''),
+    'event_poll_mode': os.getenv('EVENT_POLL_MODE', 'staggered'),
     'poll_interval': int(os.getenv('POLL_INTERVAL', '2')),
     'debug_level': os.getenv('DEBUG_LEVEL', 'INFO'),
     'log_file': os.getenv('LOG_FILE', '/tmp/print_server.log'),
+    'max_log_size': int(os.getenv('MAX_LOG_SIZE', '1048576')),
+    'low_footprint': LOW_FOOTPRINT,
+    'thread_stack_kb': int(os.getenv('THREAD_STACK_KB') or ('256' if LOW_FOOTPRINT else '0')),
     'retry_attempts': int(os.getenv('RETRY_ATTEMPTS', '3')),
     'retry_delay': int(os.getenv('RETRY_DELAY', '5')),
+    'retry_delay_max': float(os.getenv('RETRY_DELAY_MAX', '60')),
+    'breaker_failures': int(os.getenv('BREAKER_FAILURES', '3')),
+    'breaker_reset': float(os.getenv('BREAKER_RESET', '30')),
+    'max_workers': int(os.getenv('MAX_WORKERS') or ('1' if LOW_FOOTPRINT else '3')),
+    'paper_width': int(os.getenv('PAPER_WIDTH', '32')),
+    'image_max_width': int(os.getenv('IMAGE_MAX_WIDTH', '0')),
+    'image_cache_dir': os.getenv('IMAGE_CACHE_DIR', '/tmp/print_server_images'),
+    'image_cache_bytes': int(os.getenv('IMAGE_CACHE_BYTES', '262144')),
+    'image_disk_cache_bytes': int(os.getenv('IMAGE_DISK_CACHE_BYTES', '1048576')),
+    'image_nv_logo': os.getenv('IMAGE_NV_LOGO', '0') == '1',
+    'printer_weights': os.getenv('PRINTER_WEIGHTS', ''),
+    'station_priorities': os.getenv('STATION_PRIORITIES', ''),
+    'large_job_bytes': int(os.getenv('LARGE_JOB_BYTES', '4096')),
+    'priority_aging': float(os.getenv('PRIORITY_AGING', '10')),
+    'coalesce_window_ms': int(os.getenv('COALESCE_WINDOW_MS', '0')),
+    'coalesce_max_jobs': int(os.getenv('COALESCE_MAX_JOBS', '10')),
+    'offline_mode': os.getenv('OFFLINE_MODE', '1') == '1',
+    'offline_backoff_max': float(os.getenv('OFFLINE_BACKOFF_MAX', '60')),
+    'local_intake_bind': os.getenv('LOCAL_INTAKE_BIND', '0.0.0.0'),
+    'local_intake_port': int(os.getenv('LOCAL_INTAKE_PORT', '0')),
+    'local_intake_key': os.getenv('LOCAL_INTAKE_KEY', ''),
+    'printer_idle_timeout': float(os.getenv('PRINTER_IDLE_TIMEOUT', '30')),
+    'health_check_interval': float(os.getenv('HEALTH_CHECK_INTERVAL', '10')),
+    'printer_status_ttl': float(os.getenv('PRINTER_STATUS_TTL', '30')),
+    'fallback_printer': os.getenv('FALLBACK_PRINTER', ''),
+    'enable_metrics': os.getenv('ENABLE_METRICS', '0') == '1',
+    'trace_file': os.getenv('TRACE_FILE', ''),
+    'trace_max_bytes': int(os.getenv('TRACE_MAX_BYTES', '10485760')),
+    'enable_health_check': os.getenv('ENABLE_HEALTH_CHECK', '0') == '1',
+    'monitoring_bind': os.getenv('MONITORING_BIND', '0.0.0.0'),
+    'monitoring_port': int(os.getenv('MONITORING_PORT', '9180')),
+    'job_source': os.getenv('JOB_SOURCE', 'poll'),
+    'poll_interval_min': float(os.getenv('POLL_INTERVAL_MIN', '0.5')),
+    'poll_interval_max': float(os.getenv('POLL_INTERVAL_MAX', '10')),
+    'long_poll_timeout': int(os.getenv('LONG_POLL_TIMEOUT', '25')),
+    'lazy_print_data': os.getenv('LAZY_PRINT_DATA', '0') == '1',
+    'api_connect_timeout': float(os.getenv('API_CONNECT_TIMEOUT', '5')),
+    'api_read_timeout': float(os.getenv('API_READ_TIMEOUT', '15')),
+    'ack_file': os.getenv('ACK_FILE', '/tmp/print_server_acks.jsonl'),
+    'ack_batch_size': int(os.getenv('ACK_BATCH_SIZE', '20')),
+    'ack_flush_interval': float(os.getenv('ACK_FLUSH_INTERVAL', '1')),
+    'journal_file': os.getenv('JOURNAL_FILE', '/tmp/print_server_journal.jsonl'),
+    'journal_max_acked': int(os.getenv('JOURNAL_MAX_ACKED') or ('1000' if LOW_FOOTPRINT else '5000')),
+    'journal_compact_records': int(os.getenv('JOURNAL_COMPACT_RECORDS', '2000')),
     'dev_mode': os.getenv('DEV_MODE', '0') == '1'
 }
 
+
+
+class CappedFileHandler(logging.FileHandler):
+    """Log file that rolls over to a single .1 backup once it reaches max_bytes
+
+    /tmp is RAM on the router, so the log may never use more than twice
+    max_bytes. Avoids logging.handlers, which pulls in pickle and queue.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0):
+        super().__init__(filename, mode='a', delay=True)
+        self.max_bytes = max_bytes
+
+    def emit(self, record: logging.LogRecord):
+        if self.max_bytes > 0:
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                if self.stream.tell() >= self.max_bytes:
+                    self.stream.close()
+                    os.replace(self.baseFilename, self.baseFilename + '.1')
+                    self.stream = self._open()
+            except OSError:
+                self.handleError(record)
+                return
+        super().emit(record)
+
+
 logging.basicConfig(
     level=getattr(logging, CONFIG['debug_level']),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(CONFIG['log_file']) if not CONFIG['dev_mode'] else logging.StreamHandler(),
+        CappedFileHandler(CONFIG['log_file'], CONFIG['max_log_size']) if not CONFIG['dev_mode'] else logging.StreamHandler(),
         logging.StreamHandler() if CONFIG['dev_mode'] else logging.NullHandler()
     ]
 )
@@ -38,6 +124,190 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class Metrics:
+    """Counters, gauges and latency histograms rendered as Prometheus text
+
+    Hot paths check `enabled` before recording, so a disabled instance costs
+    one attribute lookup per call site.
+    """
+    
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    
+    def __init__(self, enabled: bool = False, prefix: str = 'printserver_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List] = {}
+        self._gauges: Dict[str, Callable[[], Dict[Tuple, float]]] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name: str, seconds: float, **labels):
+        """Record a duration in a histogram"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.BUCKETS), 0.0, 0]
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+    
+    def gauge(self, name: str, callback: Callable[[], Any]):
+        """Register a gauge read at scrape time
+
+        The callback returns a number, or a dict mapping label tuples to numbers.
+        """
+        self._gauges[name] = callback
+    
+    @staticmethod
+    def _labels(labels: Tuple, extra: str = '') -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return '{' + ','.join(parts) + '}' if parts else ''
+    
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self._histograms.items())
+        
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {self.prefix}{name} counter")
+                typed.add(name)
+            lines.append(f"{self.prefix}{name}{self._labels(labels)} {value}")
+        
+        for (name, labels), (buckets, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {self.prefix}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket in zip(self.BUCKETS, buckets):
+                cumulative += bucket
+                le = self._labels(labels, 'le="%s"' % bound)
+                lines.append(f"{self.prefix}{name}_bucket{le} {cumulative}")
+            le = self._labels(labels, 'le="+Inf"')
+            lines.append(f"{self.prefix}{name}_bucket{le} {count}")
+            lines.append(f"{self.prefix}{name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{self.prefix}{name}_count{self._labels(labels)} {count}")
+        
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                logger.debug(f"Gauge {name} failed: {e}")
+                continue
+            lines.append(f"# TYPE {self.prefix}{name} gauge")
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    lines.append(f"{self.prefix}{name}{self._labels(labels)} {v}")
+            else:
+                lines.append(f"{self.prefix}{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics(CONFIG['enable_metrics'])
+
+
+class TraceRecorder:
+    """Compact JSON-lines trace of polls, job outcomes and printer timings
+
+    Written for scripts/replay.py. Payloads are not recorded, only their
+    size. Each line has "k" (kind) and "t" (seconds since start):
+
+      start  config: settings that shape dispatch
+      poll   d: request seconds, s: HTTP status, ev: event, jobs: summaries
+      local  jobs: summaries of jobs posted to the local intake
+      job    id, ok, d: seconds, n: jobs in a coalesced batch
+      conn   p: printer, ok, d: connect seconds
+      send   p: printer, ok, b: bytes accepted, d: seconds
+
+    Recording stops once the file reaches max_bytes. Hot paths check
+    `enabled` first, like Metrics.
+    """
+
+    CONFIG_KEYS = ('job_source', 'poll_interval', 'max_workers', 'coalesce_window_ms', 'coalesce_max_jobs',
+                   'printer_weights', 'station_priorities', 'large_job_bytes', 'priority_aging',
+                   'retry_attempts', 'retry_delay', 'lazy_print_data')
+
+    def __init__(self, path: str = '', max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = False
+        self._file = None
+        self._size = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def open(self, config: Dict[str, Any]):
+        """Start recording to path, if one is configured"""
+        if not self.path:
+            return
+        try:
+            self._file = open(self.path, 'w', buffering=1)
+        except OSError as e:
+            logger.error(f"Failed to open trace file {self.path}: {e}")
+            return
+        self._started = time.monotonic()
+        self.enabled = True
+        self.record('start', config={key: config[key] for key in self.CONFIG_KEYS},
+                    events=[e.strip() for e in (config['event_ids'] or config['event_id']).split(',') if e.strip()])
+        logger.info(f"Recording trace to {self.path}")
+
+    def close(self):
+        with self._lock:
+            self.enabled = False
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def record(self, kind: str, **fields):
+        """Append one trace line"""
+        fields['k'] = kind
+        fields['t'] = round(time.monotonic() - self._started, 4)
+        line = json.dumps(fields, separators=(',', ':')) + '\n'
+        with self._lock:
+            if not self._file:
+                return
+            self._file.write(line)
+            self._size += len(line)
+            if self.max_bytes and self._size >= self.max_bytes:
+                logger.warning(f"Trace file reached {self.max_bytes} bytes, recording stopped")
+                self.enabled = False
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def job_summary(job: Dict) -> Dict[str, Any]:
+        """What replay needs of a job: id, printer, size and scheduling fields"""
+        summary = {'id': job.get('id'), 'p': PrintDispatcher.printer_key(job), 'b': JobScheduler.job_cost(job)}
+        if not job.get('printData') and not job.get('hasPrintData'):
+            summary['items'] = len(job.get('items', []))
+        for key in ('priority', 'station', 'eventId'):
+            if job.get(key) is not None:
+                summary[key] = job[key]
+        return summary
+
+
+TRACE = TraceRecorder(CONFIG['trace_file'], CONFIG['trace_max_bytes'])
+
+
 class ESCPOSCommands:
     """ESC/POS command constants"""
     INIT = b'\x1b\x40'
@@ -50,121 +320,197 @@ class ESCPOSCommands:
     DOUBLE_HEIGHT = b'\x1b\x21\x10'
     NORMAL_SIZE = b'\x1b\x21\x00'
     LINE_FEED = b'\n'
+    STATUS_PRINTER = b'\x10\x04\x01'
+    STATUS_OFFLINE = b'\x10\x04\x02'
+    STATUS_PAPER = b'\x10\x04\x04'
+    NV_PRINT = b'\x1c\x70\x01\x00'
 
 
 class SimplePrinter:
     """Basic ESC/POS printer communication"""
     
+    # Base64 characters decoded per step when streaming printData (multiple of 4)
+    DECODE_CHUNK = 16384
+    BASE64 = re.compile(r'[A-Za-z0-9+/]*={0,2}')
+    
     def __init__(self, host: str, port: int = 9100):
         self.host = host
         self.port = port
         self.socket = None
         self.connected = False
+        self.last_used = 0.0
+        self.bytes_written = 0
+        self.stats = {'bytes_sent': 0, 'send_time': 0.0, 'transfers': 0}
     
     def connect(self) -> bool:
         """Establish TCP connection to printer"""
+        started = time.monotonic()
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(5.0)
             self.socket.connect((self.host, self.port))
             self.connected = True
+            self.last_used = time.monotonic()
+            if METRICS.enabled:
+                METRICS.observe('printer_connect_seconds', self.last_used - started, printer=f"{self.host}:{self.port}")
+            if TRACE.enabled:
+                TRACE.record('conn', p=f"{self.host}:{self.port}", ok=True, d=round(self.last_used - started, 4))
             logger.info(f"Connected to printer at {self.host}:{self.port}")
             return True
         except Exception as e:
             logger.error(f"Failed to connect to printer {self.host}:{self.port}: {e}")
             self.connected = False
+            if METRICS.enabled:
+                METRICS.inc('printer_connect_failures_total', printer=f"{self.host}:{self.port}")
+            if TRACE.enabled:
+                TRACE.record('conn', p=f"{self.host}:{self.port}", ok=False, d=round(time.monotonic() - started, 4))
             return False
     
+    def is_alive(self) -> bool:
+        """Check that an open connection has not been closed by the printer"""
+        if not self.connected:
+            return False
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+            if readable:
+                # Drain any unsolicited status bytes; an empty read means EOF
+                if not self.socket.recv(1024):
+                    return False
+            return True
+        except (OSError, ValueError):
+            return False
+    
+    def query_status(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        """Read real-time status with DLE EOT 1, 2 and 4
+
+        Returns None if the printer did not answer every query.
+        """
+        replies = []
+        try:
+            self.socket.settimeout(timeout)
+            for query in (ESCPOSCommands.STATUS_PRINTER, ESCPOSCommands.STATUS_OFFLINE,
+                          ESCPOSCommands.STATUS_PAPER):
+                self.socket.sendall(query)
+                reply = self.socket.recv(1)
+                # Status bytes always have bits 1 and 4 set and bits 0 and 7 clear
+                if not reply or reply[0] & 0x93 != 0x12:
+                    return None
+                replies.append(reply[0])
+        except socket.timeout:
+            return None
+        except OSError:
+            self.disconnect()
+            return None
+        finally:
+            if self.socket:
+                self.socket.settimeout(5.0)
+        
+        printer, offline, paper = replies
+        status = {
+            'online': not printer & 0x08,
+            'cover_open': bool(offline & 0x04),
+            'paper_out': bool(offline & 0x20) or (paper & 0x60) == 0x60,
+            'paper_near_end': (paper & 0x0C) == 0x0C,
+            'error': bool(offline & 0x40),
+        }
+        status['ready'] = (status['online'] and not status['cover_open']
+                           and not status['paper_out'] and not status['error'])
+        return status
+    
     def send(self, data: bytes) -> bool:
         """Send raw data to printer"""
+        return self.send_chunks((data,))
+    
+    def send_chunks(self, chunks: Iterable[bytes]) -> bool:
+        """Stream data to printer chunk by chunk
+
+        bytes_written tracks how much of the stream the socket accepted, also
+        when the transfer fails part way.
+        """
+        reused = self.connected
         if not self.connected:
             if not self.connect():
                 return False
         
+        chunks = iter(chunks)
+        chunk = b''
+        self.bytes_written = 0
+        started = time.monotonic()
         try:
-            self.socket.send(data)
-            return True
+            for chunk in chunks:
+                self._write_all(chunk)
+        except (binascii.Error, ValueError) as e:
+            logger.error(f"Invalid print data for {self.host}:{self.port}: {e}")
+            return False
         except Exception as e:
-            logger.error(f"Failed to send data to printer: {e}")
             self.disconnect()
+            if reused and self.bytes_written == 0:
+                # A kept-alive socket may have gone stale; retry once on a fresh one
+                logger.warning(f"Send on reused connection to {self.host}:{self.port} failed ({e}), reconnecting")
+                return self.send_chunks(itertools.chain((chunk,), chunks))
+            logger.error(f"Failed to send data to printer after {self.bytes_written} bytes: {e}")
+            if TRACE.enabled:
+                TRACE.record('send', p=f"{self.host}:{self.port}", ok=False, b=self.bytes_written,
+                             d=round(time.monotonic() - started, 4))
             return False
+        
+        elapsed = time.monotonic() - started
+        self.last_used = time.monotonic()
+        self.stats['bytes_sent'] += self.bytes_written
+        self.stats['send_time'] += elapsed
+        self.stats['transfers'] += 1
+        if METRICS.enabled:
+            METRICS.observe('printer_send_seconds', elapsed, printer=f"{self.host}:{self.port}")
+            METRICS.inc('printer_bytes_sent_total', self.bytes_written, printer=f"{self.host}:{self.port}")
+        if TRACE.enabled:
+            TRACE.record('send', p=f"{self.host}:{self.port}", ok=True, b=self.bytes_written, d=round(elapsed, 4))
+        logger.debug(f"Sent {self.bytes_written} bytes to {self.host}:{self.port} in {elapsed * 1000:.1f}ms")
+        return True
+    
+    def _write_all(self, data: bytes):
+        """Write a buffer, looping over partial sends until the socket takes it all"""
+        view = memoryview(data)
+        while view:
+            # Blocks (up to the socket timeout) while the printer's receive window is full
+            written = self.socket.send(view)
+            self.bytes_written += written
+            view = view[written:]
+    
+    def throughput(self) -> float:
+        """Average send rate to this printer in bytes per second"""
+        if not self.stats['send_time']:
+            return 0.0
+        return self.stats['bytes_sent'] / self.stats['send_time']
+    
+    @classmethod
+    def iter_base64(cls, print_data: str) -> Iterator[bytes]:
+        """Decode base64 print data in fixed-size chunks
+
+        The whole payload is validated up front: decoding only fails on the
+        last chunk otherwise, after most of the ticket has been printed.
+        """
+        if '\n' in print_data or '\r' in print_data or ' ' in print_data:
+            print_data = ''.join(print_data.split())
+        if len(print_data) % 4 or not cls.BASE64.fullmatch(print_data):
+            raise binascii.Error("Invalid base64 print data")
+        return (binascii.a2b_base64(print_data[offset:offset + cls.DECODE_CHUNK])
+                for offset in range(0, len(print_data), cls.DECODE_CHUNK))
     
     def send_raw_print_data(self, print_data: str) -> bool:
         """Send base64-encoded print data directly to printer"""
         try:
-            import base64
-            raw_data = base64.b64decode(print_data)
-            return self.send(raw_data)
+            return self.send_chunks(self.iter_base64(print_data))
         except Exception as e:
             logger.error(f"Failed to decode/send print data: {e}")
             return False
     
-    def print_order(self, order: Dict[str, Any], settings: Dict[str, Any] = None) -> bool:
+    def print_order(self, order: Dict[str, Any], settings: Dict[str, Any] = None,
+                    template: Optional['ReceiptTemplate'] = None) -> bool:
         """Format and print order"""
         try:
-            data = bytearray()
-            
-            data.extend(ESCPOSCommands.INIT)
-            
-            if settings and settings.get('header'):
-                data.extend(ESCPOSCommands.ALIGN_CENTER)
-                data.extend(ESCPOSCommands.DOUBLE_HEIGHT)
-                data.extend(settings['header'].encode('utf-8'))
-                data.extend(ESCPOSCommands.LINE_FEED * 2)
-            
-            data.extend(ESCPOSCommands.NORMAL_SIZE)
-            data.extend(ESCPOSCommands.ALIGN_CENTER)
-            data.extend(b"ORDER #" + str(order.get('id', 'N/A')).encode('utf-8'))
-            data.extend(ESCPOSCommands.LINE_FEED * 2)
-            
-            data.extend(ESCPOSCommands.ALIGN_LEFT)
-            data.extend(b"-" * 32)
-            data.extend(ESCPOSCommands.LINE_FEED)
-            
-            for item in order.get('items', []):
-                qty = str(item.get('quantity', 1))
-                name = item.get('name', 'Unknown Item')
-                price = f"${item.get('price', 0):.2f}"
-                
-                line = f"{qty}x {name}".ljust(24) + price.rjust(8)
-                data.extend(line.encode('utf-8'))
-                data.extend(ESCPOSCommands.LINE_FEED)
-                
-                if item.get('notes'):
-                    data.extend(f"  Note: {item['notes']}".encode('utf-8'))
-                    data.extend(ESCPOSCommands.LINE_FEED)
-            
-            data.extend(b"-" * 32)
-            data.extend(ESCPOSCommands.LINE_FEED)
-            
-            total = order.get('total', 0)
-            data.extend(ESCPOSCommands.BOLD_ON)
-            data.extend(f"TOTAL:".ljust(24).encode('utf-8'))
-            data.extend(f"${total:.2f}".rjust(8).encode('utf-8'))
-            data.extend(ESCPOSCommands.BOLD_OFF)
-            data.extend(ESCPOSCommands.LINE_FEED * 2)
-            
-            customer = order.get('customer', {})
-            if customer.get('name'):
-                data.extend(f"Customer: {customer['name']}".encode('utf-8'))
-                data.extend(ESCPOSCommands.LINE_FEED)
-            if customer.get('phone'):
-                data.extend(f"Phone: {customer['phone']}".encode('utf-8'))
-                data.extend(ESCPOSCommands.LINE_FEED)
-            
-            if order.get('notes'):
-                data.extend(ESCPOSCommands.LINE_FEED)
-                data.extend(b"Notes: " + order['notes'].encode('utf-8'))
-                data.extend(ESCPOSCommands.LINE_FEED)
-            
-            data.extend(ESCPOSCommands.LINE_FEED * 2)
-            data.extend(ESCPOSCommands.ALIGN_CENTER)
-            data.extend(datetime.now().strftime("%Y-%m-%d %H:%M:%S").encode('utf-8'))
-            data.extend(ESCPOSCommands.LINE_FEED * 3)
-            
-            data.extend(ESCPOSCommands.CUT)
-            
-            return self.send(bytes(data))
+            if template is None:
+                template = ReceiptTemplate(settings)
+            return self.send(template.render(order))
             
         except Exception as e:
             logger.error(f"Failed to format order for printing: {e}")
@@ -182,43 +528,2038 @@ class SimplePrinter:
             logger.info(f"Disconnected from printer {self.host}:{self.port}")
 
 
+class ApiClient:
+    """Keep-alive HTTP(S) client for the FriendlyPOS API
+
+    Connections are kept open and reused between requests, with one idle
+    connection per concurrent caller. A request that fails on a reused
+    connection the server has already closed is retried once on a new one.
+    """
+
+    DEFAULT_HEADERS = {'Accept-Encoding': 'gzip'}
+
+    def __init__(self, base_url: str, connect_timeout: float = 5.0,
+                 read_timeout: float = 15.0, max_idle: int = 4):
+        import urllib.parse
+        parsed = urllib.parse.urlsplit(base_url)
+        self.https = parsed.scheme == 'https'
+        self.netloc = parsed.netloc
+        self.base_path = parsed.path.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_idle = max_idle
+        self._idle: List['http.client.HTTPConnection'] = []
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'handshakes': 0,
+            'reconnects': 0,
+            'total_latency': 0.0,
+            'last_latency': 0.0,
+        }
+
+    def _connect(self) -> 'http.client.HTTPConnection':
+        import http.client
+        conn_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = conn_class(self.netloc, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        with self._lock:
+            self.stats['handshakes'] += 1
+        return conn
+
+    def _checkout(self) -> Tuple['http.client.HTTPConnection', bool]:
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if conn.sock is not None:
+                    return conn, True
+        return self._connect(), False
+
+    def _checkin(self, conn: 'http.client.HTTPConnection'):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None,
+                timeout: Optional[float] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Send a request and return (status, lower-cased headers, decoded body)
+
+        headers is not copied; callers on the poll path pass the same dict
+        every time, with Accept-Encoding already set.
+        """
+        import http.client
+        if headers is None:
+            headers = self.DEFAULT_HEADERS
+        elif 'Accept-Encoding' not in headers:
+            headers = dict(headers, **self.DEFAULT_HEADERS)
+        started = time.monotonic()
+        conn = None
+        try:
+            # Inside the try so a failed connect counts as a failed request
+            conn, reused = self._checkout()
+            while True:
+                try:
+                    conn.sock.settimeout(timeout or self.read_timeout)
+                    conn.request(method, self.base_path + path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    payload = response.read()
+                    break
+                except (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                        ConnectionResetError, BrokenPipeError) as e:
+                    conn.close()
+                    if not reused:
+                        raise
+                    logger.debug(f"Stale API connection ({e}), reconnecting")
+                    with self._lock:
+                        self.stats['reconnects'] += 1
+                    conn, reused = self._connect(), False
+        except Exception:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['errors'] += 1
+            raise
+
+        if response.getheader('Content-Encoding', '').lower() == 'gzip':
+            import gzip
+            payload = gzip.decompress(payload)
+        response_headers = {k.lower(): v for k, v in response.getheaders()}
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(conn)
+
+        latency = time.monotonic() - started
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['total_latency'] += latency
+            self.stats['last_latency'] = latency
+        return response.status, response_headers, payload
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request counters plus average latency in seconds"""
+        with self._lock:
+            stats = dict(self.stats)
+        completed = stats['requests'] - stats['errors']
+        stats['avg_latency'] = stats['total_latency'] / completed if completed else 0.0
+        return stats
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class ReceiptTemplate:
+    """Receipt layout compiled once per event settings and paper width
+
+    Everything that does not depend on the order (commands, header,
+    separators, labels) is encoded to bytes up front, so render() only
+    formats the per-order fields.
+    """
+    
+    PRICE_WIDTH = 8
+    
+    def __init__(self, settings: Optional[Dict[str, Any]] = None, width: Optional[int] = None,
+                 logo: Optional['RasterImage'] = None):
+        settings = settings or {}
+        self.width = int(width or settings.get('paper_width') or CONFIG['paper_width'])
+        name_width = self.width - self.PRICE_WIDTH
+        cmd = ESCPOSCommands
+        
+        # The logo goes between INIT and the header, either as raster data or
+        # as a reference to the copy stored in the printer's NV memory
+        self.logo = logo
+        self._logo = cmd.ALIGN_CENTER + logo.escpos() + cmd.LINE_FEED if logo else b''
+        self._nv_logo = cmd.ALIGN_CENTER + cmd.NV_PRINT + cmd.LINE_FEED if logo else b''
+        head = bytearray()
+        if settings.get('header'):
+            head += cmd.ALIGN_CENTER + cmd.DOUBLE_HEIGHT
+            head += settings['header'].encode('utf-8') + cmd.LINE_FEED * 2
+        head += cmd.NORMAL_SIZE + cmd.ALIGN_CENTER + b"ORDER #"
+        self._head = bytes(head)
+        
+        separator = b"-" * self.width + cmd.LINE_FEED
+        self._after_id = cmd.LINE_FEED * 2 + cmd.ALIGN_LEFT + separator
+        self._before_total = separator + cmd.BOLD_ON + "TOTAL:".ljust(name_width).encode('utf-8')
+        self._after_total = cmd.BOLD_OFF + cmd.LINE_FEED * 2
+        self._before_timestamp = cmd.LINE_FEED * 2 + cmd.ALIGN_CENTER
+        self._tail = cmd.LINE_FEED * 3 + cmd.CUT
+        self._item_format = f"{{:<{name_width}}}{{:>{self.PRICE_WIDTH}}}\n"
+        self._price_format = f"{{:>{self.PRICE_WIDTH}}}"
+        self._timestamp = (0, b'')
+    
+    def _now(self) -> bytes:
+        # Receipts are stamped to the second, so reuse the encoded timestamp
+        second = int(time.time())
+        if self._timestamp[0] != second:
+            self._timestamp = (second, datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S").encode('utf-8'))
+        return self._timestamp[1]
+    
+    def render(self, order: Dict[str, Any], nv_logo: bool = False) -> bytes:
+        """Build the ESC/POS byte stream for an order
+
+        nv_logo prints the logo from NV memory instead of sending it.
+        """
+        item_format = self._item_format
+        lines = []
+        for item in order.get('items', []):
+            lines.append(item_format.format(
+                f"{item.get('quantity', 1)}x {item.get('name', 'Unknown Item')}",
+                f"${item.get('price', 0):.2f}"
+            ))
+            if item.get('notes'):
+                lines.append(f"  Note: {item['notes']}\n")
+        
+        footer = []
+        customer = order.get('customer', {})
+        if customer.get('name'):
+            footer.append(f"Customer: {customer['name']}\n")
+        if customer.get('phone'):
+            footer.append(f"Phone: {customer['phone']}\n")
+        if order.get('notes'):
+            footer.append(f"\nNotes: {order['notes']}\n")
+        
+        return b''.join((
+            ESCPOSCommands.INIT,
+            self._nv_logo if nv_logo else self._logo,
+            self._head,
+            str(order.get('id', 'N/A')).encode('utf-8'),
+            self._after_id,
+            ''.join(lines).encode('utf-8'),
+            self._before_total,
+            self._price_format.format(f"${order.get('total', 0):.2f}").encode('utf-8'),
+            self._after_total,
+            ''.join(footer).encode('utf-8'),
+            self._before_timestamp,
+            self._now(),
+            self._tail,
+        ))
+
+
+class RasterImage:
+    """1-bit image ready for ESC/POS, packed MSB first with 1 = black dot
+
+    Built from PNG, PBM or PGM data with from_image(), which scales the
+    picture down to the paper's dot width and Floyd-Steinberg dithers it.
+    The packed rows are exactly a binary PBM (P4) body, which is how the
+    disk cache stores them.
+    """
+
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    # GS v 0 band height; some printers reject taller single commands
+    BAND_ROWS = 256
+
+    def __init__(self, width: int, height: int, bits: bytes, ref: str = ''):
+        self.width = width
+        self.height = height
+        self.width_bytes = (width + 7) // 8
+        self.bits = bits
+        self.ref = ref
+        self._escpos: Optional[bytes] = None
+
+    @classmethod
+    def from_image(cls, data: bytes, max_width: int, ref: str = '') -> 'RasterImage':
+        """Decode, scale to at most max_width dots and dither"""
+        if data.startswith(b'P4'):
+            image = cls.from_pbm(data, ref)
+            if image.width <= max_width:
+                return image
+        width, height, gray = cls.decode(data)
+        if width > max_width:
+            width, height, gray = cls._scale(width, height, gray, max_width)
+        return cls(width, height, cls._dither(width, height, gray), ref)
+
+    @classmethod
+    def from_pbm(cls, data: bytes, ref: str = '') -> 'RasterImage':
+        """Load a binary PBM as-is"""
+        width, height, offset = cls._pnm_header(data)
+        size = (width + 7) // 8 * height
+        if len(data) < offset + size:
+            raise ValueError("Truncated PBM image")
+        return cls(width, height, data[offset:offset + size], ref)
+
+    def to_pbm(self) -> bytes:
+        return b'P4\n%d %d\n' % (self.width, self.height) + self.bits
+
+    def escpos(self) -> bytes:
+        """GS v 0 raster commands printing the image"""
+        if self._escpos is None:
+            out = bytearray()
+            row_bytes = self.width_bytes
+            for top in range(0, self.height, self.BAND_ROWS):
+                rows = min(self.BAND_ROWS, self.height - top)
+                out += b'\x1dv0\x00' + bytes((row_bytes & 0xff, row_bytes >> 8, rows & 0xff, rows >> 8))
+                out += self.bits[top * row_bytes:(top + rows) * row_bytes]
+            self._escpos = bytes(out)
+        return self._escpos
+
+    def nv_define(self) -> bytes:
+        """FS q command storing the image as NV bit image 1
+
+        FS q takes column-major data: for each dot column, the column's
+        bytes top to bottom, height padded to a multiple of 8.
+        """
+        row_bytes = self.width_bytes
+        height_bytes = (self.height + 7) // 8
+        if row_bytes > 1023 or height_bytes > 288:
+            raise ValueError("Image too large for NV memory")
+        bits = self.bits
+        out = bytearray(b'\x1cq\x01' + bytes((row_bytes & 0xff, row_bytes >> 8,
+                                              height_bytes & 0xff, height_bytes >> 8)))
+        for x in range(row_bytes * 8):
+            byte_index, mask = x >> 3, 0x80 >> (x & 7)
+            for band in range(height_bytes):
+                value = 0
+                for y in range(band * 8, min(band * 8 + 8, self.height)):
+                    if bits[y * row_bytes + byte_index] & mask:
+                        value |= 0x80 >> (y - band * 8)
+                out.append(value)
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data: bytes) -> Tuple[int, int, bytearray]:
+        """Decode PNG, PBM or PGM to (width, height, 8-bit gray pixels)"""
+        if data.startswith(cls.PNG_SIGNATURE):
+            return cls._decode_png(data)
+        if data[:2] in (b'P1', b'P2', b'P4', b'P5'):
+            return cls._decode_pnm(data)
+        raise ValueError("Unsupported image format (need PNG, PBM or PGM)")
+
+    @staticmethod
+    def _pnm_header(data: bytes, fields: int = 3) -> Tuple[int, ...]:
+        """Parse a PNM header; returns its numeric fields and the data offset"""
+        values = []
+        pos = 2
+        while len(values) < fields - 1:
+            while pos < len(data) and data[pos:pos + 1].isspace():
+                pos += 1
+            if data[pos:pos + 1] == b'#':
+                while pos < len(data) and data[pos:pos + 1] not in (b'\n', b'\r'):
+                    pos += 1
+                continue
+            start = pos
+            while pos < len(data) and data[pos:pos + 1].isdigit():
+                pos += 1
+            if start == pos:
+                raise ValueError("Invalid PNM header")
+            values.append(int(data[start:pos]))
+        # Exactly one whitespace byte separates the header from binary data
+        return tuple(values) + (pos + 1,)
+
+    @classmethod
+    def _decode_pnm(cls, data: bytes) -> Tuple[int, int, bytearray]:
+        kind = data[:2]
+        if kind in (b'P1', b'P4'):
+            width, height, offset = cls._pnm_header(data)
+            maxval = 1
+        else:
+            width, height, maxval, offset = cls._pnm_header(data, 4)
+            if not 0 < maxval < 256:
+                raise ValueError("Only 8-bit PGM images are supported")
+        if kind == b'P4':
+            image = cls.from_pbm(data)
+            return width, height, bytearray(
+                0 if image.bits[y * image.width_bytes + (x >> 3)] & (0x80 >> (x & 7)) else 255
+                for y in range(height) for x in range(width))
+        if kind == b'P5':
+            pixels = data[offset:offset + width * height]
+        elif kind == b'P1':
+            # Plain PBM digits need not be separated
+            pixels = [c - 48 for c in data[offset:] if c in (48, 49)][:width * height]
+        else:
+            pixels = [int(v) for v in data[offset:].split()[:width * height]]
+        if len(pixels) < width * height:
+            raise ValueError("Truncated PNM image")
+        if kind == b'P1':
+            return width, height, bytearray(0 if v else 255 for v in pixels)
+        return width, height, bytearray(v * 255 // maxval for v in pixels)
+
+    @classmethod
+    def _decode_png(cls, data: bytes) -> Tuple[int, int, bytearray]:
+        import struct
+        import zlib
+        pos = len(cls.PNG_SIGNATURE)
+        header = None
+        palette = b''
+        transparency = b''
+        idat = []
+        while pos + 8 <= len(data):
+            length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+            chunk = data[pos + 8:pos + 8 + length]
+            pos += 12 + length
+            if kind == b'IHDR':
+                header = struct.unpack('>IIBBBBB', chunk)
+            elif kind == b'PLTE':
+                palette = chunk
+            elif kind == b'tRNS':
+                transparency = chunk
+            elif kind == b'IDAT':
+                idat.append(chunk)
+            elif kind == b'IEND':
+                break
+        if header is None:
+            raise ValueError("PNG without IHDR")
+        width, height, depth, color, _, _, interlace = header
+        if interlace:
+            raise ValueError("Interlaced PNG images are not supported")
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color)
+        if channels is None:
+            raise ValueError(f"Unsupported PNG color type {color}")
+
+        raw = zlib.decompress(b''.join(idat))
+        stride = (width * channels * depth + 7) // 8
+        bpp = max(1, channels * depth // 8)
+        previous = bytearray(stride)
+        rows = []
+        pos = 0
+        for _ in range(height):
+            kind = raw[pos]
+            row = bytearray(raw[pos + 1:pos + 1 + stride])
+            pos += stride + 1
+            if kind == 1:
+                for i in range(bpp, stride):
+                    row[i] = (row[i] + row[i - bpp]) & 0xff
+            elif kind == 2:
+                for i in range(stride):
+                    row[i] = (row[i] + previous[i]) & 0xff
+            elif kind == 3:
+                for i in range(stride):
+                    left = row[i - bpp] if i >= bpp else 0
+                    row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xff
+            elif kind == 4:
+                for i in range(stride):
+                    a = row[i - bpp] if i >= bpp else 0
+                    b = previous[i]
+                    c = previous[i - bpp] if i >= bpp else 0
+                    p = a + b - c
+                    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                    row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+            elif kind:
+                raise ValueError(f"Invalid PNG filter {kind}")
+            rows.append(row)
+            previous = row
+
+        gray = bytearray(width * height)
+        out = 0
+        for row in rows:
+            if depth < 8:
+                # Gray or palette index packed several to a byte
+                per_byte = 8 // depth
+                mask = (1 << depth) - 1
+                samples = [(row[x // per_byte] >> (8 - depth * (x % per_byte + 1))) & mask for x in range(width)]
+                step = 1
+            elif depth == 16:
+                samples = row[::2]
+                step = channels
+            else:
+                samples = row
+                step = channels
+            for x in range(width):
+                i = x * step
+                if color == 3:
+                    index = samples[i]
+                    r, g, b = palette[index * 3:index * 3 + 3] or b'\xff\xff\xff'
+                    alpha = transparency[index] if index < len(transparency) else 255
+                    value = (r * 299 + g * 587 + b * 114) // 1000
+                elif color in (0, 4):
+                    value = samples[i]
+                    if depth < 8:
+                        value = value * 255 // ((1 << depth) - 1)
+                    alpha = samples[i + 1] if color == 4 else 255
+                else:
+                    value = (samples[i] * 299 + samples[i + 1] * 587 + samples[i + 2] * 114) // 1000
+                    alpha = samples[i + 3] if color == 6 else 255
+                if alpha != 255:
+                    # Composite onto white paper
+                    value = (value * alpha + 255 * (255 - alpha)) // 255
+                gray[out] = value
+                out += 1
+        return width, height, gray
+
+    @staticmethod
+    def _scale(width: int, height: int, gray: bytearray, max_width: int) -> Tuple[int, int, bytearray]:
+        """Box-filter downscale to max_width, keeping the aspect ratio"""
+        new_width = max_width
+        new_height = max(1, height * new_width // width)
+        x_spans = [(x * width // new_width, max(x * width // new_width + 1, (x + 1) * width // new_width))
+                   for x in range(new_width)]
+        out = bytearray(new_width * new_height)
+        i = 0
+        for y in range(new_height):
+            y0 = y * height // new_height
+            y1 = max(y0 + 1, (y + 1) * height // new_height)
+            rows = [gray[r * width:(r + 1) * width] for r in range(y0, y1)]
+            for x0, x1 in x_spans:
+                total = 0
+                for row in rows:
+                    total += sum(row[x0:x1])
+                out[i] = total // ((x1 - x0) * len(rows))
+                i += 1
+        return new_width, new_height, out
+
+    @staticmethod
+    def _dither(width: int, height: int, gray: bytearray) -> bytes:
+        """Floyd-Steinberg dither to packed 1-bit rows (1 = black)"""
+        row_bytes = (width + 7) // 8
+        out = bytearray(row_bytes * height)
+        # Error terms for the current and next row, scaled by 16
+        current = [0] * (width + 2)
+        below = [0] * (width + 2)
+        for y in range(height):
+            base = y * width
+            out_base = y * row_bytes
+            for x in range(width):
+                value = gray[base + x] + (current[x + 1] >> 4)
+                if value < 128:
+                    out[out_base + (x >> 3)] |= 0x80 >> (x & 7)
+                    error = value
+                else:
+                    error = value - 255
+                current[x + 2] += error * 7
+                below[x] += error * 3
+                below[x + 1] += error * 5
+                below[x + 2] += error
+            current, below = below, [0] * (width + 2)
+        return bytes(out)
+
+
+class ImageCache:
+    """Bounded LRU of dithered images in memory and on disk
+
+    Images are keyed by the reference jobs and event settings use (a hash)
+    plus the dot width they were scaled to. Misses are loaded from the disk
+    cache, then fetched with fetch(ref) and converted once. References that
+    fail to load are not retried for FAILURE_TTL seconds.
+    """
+
+    FAILURE_TTL = 60.0
+    NV_STATE_FILE = 'nv_images.json'
+
+    def __init__(self, fetch: Callable[[str], Optional[bytes]], cache_dir: str = '',
+                 memory_bytes: int = 262144, disk_bytes: int = 1048576):
+        self.fetch = fetch
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._images: 'OrderedDict[Tuple[str, int], RasterImage]' = OrderedDict()
+        self._size = 0
+        self._failed: Dict[str, float] = {}
+        self._nv: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'fetches': 0, 'errors': 0}
+
+    @staticmethod
+    def valid_ref(ref: Any) -> bool:
+        """References become file names, so only allow hash-like strings"""
+        return (isinstance(ref, str) and 0 < len(ref) <= 128 and not ref.startswith('.')
+                and ref.replace('-', '').replace('_', '').replace('.', '').isalnum())
+
+    def get(self, ref: str, max_width: int) -> Optional[RasterImage]:
+        """Image for ref scaled to at most max_width dots, or None if unavailable"""
+        if not self.valid_ref(ref):
+            logger.warning(f"Ignoring invalid image reference {ref!r}")
+            return None
+        key = (ref, max_width)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.stats['hits'] += 1
+                return image
+            if self._failed.get(ref, 0) > time.monotonic():
+                return None
+
+        image = self._load(ref, max_width)
+        if image is None:
+            try:
+                data = self.fetch(ref)
+                if not data:
+                    raise ValueError("not found")
+                image = RasterImage.from_image(data, max_width, ref)
+            except Exception as e:
+                logger.error(f"Failed to load image {ref}: {e}")
+                with self._lock:
+                    self.stats['errors'] += 1
+                    self._failed[ref] = time.monotonic() + self.FAILURE_TTL
+                return None
+            with self._lock:
+                self.stats['fetches'] += 1
+            logger.info(f"Cached image {ref} as {image.width}x{image.height} dots")
+            self._store(ref, max_width, image)
+        else:
+            with self._lock:
+                self.stats['disk_hits'] += 1
+
+        with self._lock:
+            self._failed.pop(ref, None)
+            if key not in self._images:
+                self._images[key] = image
+                self._size += len(image.bits)
+            while self._size > self.memory_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted.bits)
+        return image
+
+    def _path(self, ref: str, max_width: int) -> str:
+        return os.path.join(self.cache_dir, f"{ref}-{max_width}.pbm")
+
+    def _load(self, ref: str, max_width: int) -> Optional[RasterImage]:
+        if not self.cache_dir:
+            return None
+        path = self._path(ref, max_width)
+        try:
+            with open(path, 'rb') as f:
+                image = RasterImage.from_pbm(f.read(), ref)
+            os.utime(path)
+            return image
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cached image {path}: {e}")
+            return None
+
+    def _store(self, ref: str, max_width: int, image: RasterImage):
+        if not self.cache_dir or not self.disk_bytes:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(ref, max_width)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(image.to_pbm())
+            os.replace(tmp_path, path)
+
+            # Evict least recently used files once over the disk budget
+            entries = []
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.pbm'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, old_path in sorted(entries):
+                if total <= self.disk_bytes or old_path == path:
+                    break
+                os.remove(old_path)
+                total -= size
+        except OSError as e:
+            logger.warning(f"Failed to write image cache: {e}")
+
+    def nv_image(self, printer: str) -> Optional[str]:
+        """Reference of the image last stored in a printer's NV memory"""
+        with self._lock:
+            if self._nv is None:
+                self._nv = {}
+                if self.cache_dir:
+                    try:
+                        with open(os.path.join(self.cache_dir, self.NV_STATE_FILE)) as f:
+                            self._nv = json.load(f)
+                    except (OSError, ValueError):
+                        pass
+            return self._nv.get(printer)
+
+    def set_nv_image(self, printer: str, ref: str):
+        """Remember what a printer holds in NV memory, across restarts
+
+        NV memory wears out after a limited number of writes, so this is what
+        keeps the logo from being stored again on every start.
+        """
+        self.nv_image(printer)
+        with self._lock:
+            self._nv[printer] = ref
+            state = dict(self._nv)
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, self.NV_STATE_FILE)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(state, f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning(f"Failed to save NV image state: {e}")
+
+
+class PrinterPool:
+    """Persistent printer connections keyed by (host, port)
+
+    A printer is held exclusively between acquire() and release(). Connections
+    that have been idle longer than idle_timeout, or that the printer has
+    closed, are dropped and re-established on next use.
+    """
+
+    def __init__(self, idle_timeout: float = 30.0):
+        self.idle_timeout = idle_timeout
+        # Set while offline so connections survive quiet spells
+        self.keep_warm = False
+        self._printers: Dict[Tuple[str, int], SimplePrinter] = {}
+        self._locks: Dict[Tuple[str, int], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str, port: int = 9100) -> SimplePrinter:
+        """Get the pooled printer for host:port, creating it if needed"""
+        key = (host, int(port))
+        with self._lock:
+            printer = self._printers.get(key)
+            if printer is None:
+                printer = self._printers[key] = SimplePrinter(host, int(port))
+                self._locks[key] = threading.Lock()
+            lock = self._locks[key]
+        lock.acquire()
+
+        if printer.connected:
+            if not self.keep_warm and time.monotonic() - printer.last_used > self.idle_timeout:
+                printer.disconnect()
+            elif not printer.is_alive():
+                logger.info(f"Pooled connection to {host}:{port} was closed by printer")
+                printer.disconnect()
+        return printer
+
+    def try_acquire(self, host: str, port: int = 9100) -> Optional[SimplePrinter]:
+        """Get the pooled printer for host:port only if it is known and not in use"""
+        key = (host, int(port))
+        with self._lock:
+            printer = self._printers.get(key)
+            lock = self._locks.get(key)
+        if printer is None or not lock.acquire(blocking=False):
+            return None
+        return printer
+
+    def keys(self) -> List[Tuple[str, int]]:
+        """(host, port) of every printer used so far"""
+        with self._lock:
+            return list(self._printers)
+
+    def release(self, printer: SimplePrinter):
+        """Return a printer to the pool, keeping its connection open"""
+        self._locks[(printer.host, printer.port)].release()
+
+    def close_idle(self):
+        """Close connections idle for longer than idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            entries = [(self._printers[key], self._locks[key]) for key in self._printers]
+        for printer, lock in entries:
+            if printer.connected and now - printer.last_used > self.idle_timeout:
+                if lock.acquire(blocking=False):
+                    try:
+                        printer.disconnect()
+                    finally:
+                        lock.release()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Transfer counters and average bytes/s per printer"""
+        with self._lock:
+            printers = list(self._printers.values())
+        return {f"{p.host}:{p.port}": dict(p.stats, bytes_per_second=p.throughput()) for p in printers}
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            printers = list(self._printers.values())
+        for printer in printers:
+            printer.disconnect()
+
+
+class PrinterHealthMonitor:
+    """Background real-time status probing of known printers
+
+    Every interval each pooled printer that is connected and not busy, or
+    that was last seen down, is sent DLE EOT status queries. Results are
+    cached for ttl seconds so jobs for a printer known to be down can be
+    retried later or rerouted; a ticket that gets through marks it ready.
+    Printers that are not connected are probed over a separate connection,
+    so their queued jobs never wait behind a connect timeout.
+    """
+
+    def __init__(self, pool: PrinterPool, interval: float = 10.0, ttl: float = 30.0):
+        self.pool = pool
+        self.interval = interval
+        self.ttl = ttl
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the probe thread (no-op when interval is 0)"""
+        if self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='printer-health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the probe thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def report(self, host: str, port: int, ready: bool, reason: str = ''):
+        """Override the cached state, e.g. ready once the print path got a ticket through"""
+        key = f"{host}:{port}"
+        status = {'ready': ready, 'reason': reason}
+        with self._lock:
+            previous = self._status.get(key)
+        if previous and previous.get('no_status'):
+            status['no_status'] = True
+        self._update(key, status)
+
+    def check(self, host: str, port: int) -> Tuple[bool, str]:
+        """(available, reason) for a printer; unknown or stale status counts as available"""
+        with self._lock:
+            status = self._status.get(f"{host}:{port}")
+        if not status or time.monotonic() - status['checked_at'] > self.ttl:
+            return True, ''
+        return status['ready'], status.get('reason', '')
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of the cached status of every printer"""
+        with self._lock:
+            return {key: dict(status) for key, status in self._status.items()}
+
+    def probe(self, host: str, port: int) -> Optional[Dict[str, Any]]:
+        """Query one printer now and cache the result; None if it is busy"""
+        printer = self.pool.try_acquire(host, port)
+        if printer is None:
+            return None
+        try:
+            # is_alive() also discards stale status bytes before we ask
+            if printer.connected and not printer.is_alive():
+                printer.disconnect()
+            status = self._read_status(printer) if printer.connected else None
+        finally:
+            self.pool.release(printer)
+        if status is None:
+            # Connect without holding the pooled printer: a printer that is
+            # down would otherwise stall its jobs for the connect timeout
+            printer = SimplePrinter(host, port)
+            if printer.connect():
+                status = self._read_status(printer)
+                printer.disconnect()
+            else:
+                status = {'ready': False, 'reason': 'unreachable'}
+        self._update(f"{host}:{port}", status)
+        return status
+
+    @staticmethod
+    def _read_status(printer: SimplePrinter) -> Dict[str, Any]:
+        """DLE EOT status of a connected printer, with a reason if it is not ready"""
+        status = printer.query_status()
+        if status is None and printer.connected:
+            # Still accepting data; the printer just doesn't answer DLE EOT
+            return {'ready': True, 'reason': 'no status reply', 'no_status': True}
+        if status is None:
+            return {'ready': False, 'reason': 'unreachable'}
+        problems = [name for name in ('cover_open', 'paper_out', 'error') if status[name]]
+        if not status['online']:
+            problems.append('offline')
+        status['reason'] = ', '.join(problems)
+        return status
+
+    def _update(self, key: str, status: Dict[str, Any]):
+        status['checked_at'] = time.monotonic()
+        with self._lock:
+            previous = self._status.get(key)
+            self._status[key] = status
+        if previous is None or previous['ready'] != status['ready']:
+            if status['ready']:
+                logger.info(f"Printer {key} is ready")
+            else:
+                logger.warning(f"Printer {key} is not ready: {status.get('reason') or 'unknown'}")
+
+    def _needs_probe(self, host: str, port: int) -> bool:
+        # Probe open connections, and printers known to be down to spot recovery;
+        # idle printers are not reconnected just to ask for status
+        printer = self.pool.try_acquire(host, port)
+        if printer is None:
+            return False
+        connected = printer.connected
+        self.pool.release(printer)
+        with self._lock:
+            status = self._status.get(f"{host}:{port}")
+        if status is None:
+            return connected
+        if status.get('no_status'):
+            # Don't keep stalling jobs behind queries this printer never answers
+            return False
+        return connected or not status['ready']
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for host, port in self.pool.keys():
+                if self._stop.is_set():
+                    return
+                try:
+                    if self._needs_probe(host, port):
+                        self.probe(host, port)
+                except Exception as e:
+                    logger.error(f"Status probe of {host}:{port} failed: {e}")
+
+
+class JobScheduler:
+    """Priority classes, per-printer weighted fair queuing and aging
+
+    Each job gets a priority class: the job's own 'priority' field, else its
+    'station' looked up in station_priorities, else LOW for tickets larger
+    than large_job_bytes and NORMAL otherwise. Within a printer the oldest
+    job of the best class goes first, and a waiting job is promoted one
+    class every aging seconds. Across printers the best head-of-queue class
+    wins, ties going to the printer with the least weighted service so far.
+
+    Not thread-safe: PrintDispatcher serializes access.
+    """
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+    CLASS_NAMES = {'high': HIGH, 'normal': NORMAL, 'low': LOW}
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None,
+                 station_priorities: Optional[Dict[str, int]] = None,
+                 large_job_bytes: int = 4096, aging: float = 10.0):
+        self.weights = weights or {}
+        self.station_priorities = station_priorities or {}
+        self.large_job_bytes = large_job_bytes
+        self.aging = aging
+        self._queues: Dict[str, List[deque]] = {}
+        self._vtime: Dict[str, float] = {}
+        self._vclock = 0.0
+        self._seq = 0
+        self._size = 0
+
+    @staticmethod
+    def job_cost(job: Dict) -> int:
+        """Approximate ESC/POS size of a job in bytes"""
+        if job.get('printData'):
+            return len(job['printData']) * 3 // 4
+        if job.get('printDataSize'):
+            # Payload not fetched yet (LAZY_PRINT_DATA)
+            return int(job['printDataSize'])
+        return 200 + 48 * len(job.get('items', []))
+
+    def classify(self, job: Dict) -> int:
+        """Priority class for a job"""
+        priority = job.get('priority')
+        if isinstance(priority, str) and priority.lower() in self.CLASS_NAMES:
+            return self.CLASS_NAMES[priority.lower()]
+        if isinstance(priority, int) and not isinstance(priority, bool):
+            return min(max(priority, self.HIGH), self.LOW)
+        station = job.get('station')
+        if station in self.station_priorities:
+            return self.station_priorities[station]
+        return self.LOW if self.job_cost(job) > self.large_job_bytes else self.NORMAL
+
+    def submit(self, key: str, job: Dict):
+        """Queue a job for printer key"""
+        queues = self._queues.get(key)
+        if queues is None:
+            queues = self._queues[key] = [deque() for _ in range(self.LOW + 1)]
+            # A printer that was idle re-enters at the current virtual time
+            self._vtime[key] = max(self._vtime.get(key, 0.0), self._vclock)
+        self._seq += 1
+        queues[self.classify(job)].append((time.monotonic(), self._seq, job))
+        self._size += 1
+
+    def _head(self, key: str, now: float) -> Optional[Tuple[int, int, int]]:
+        """(effective class, sequence, class) of the job printer key would send next"""
+        best = None
+        for cls, queue in enumerate(self._queues[key]):
+            if queue:
+                queued_at, seq = queue[0][0], queue[0][1]
+                effective = cls - int((now - queued_at) / self.aging) if self.aging > 0 else cls
+                candidate = (max(effective, self.HIGH), seq, cls)
+                if best is None or candidate < best:
+                    best = candidate
+        return best
+
+    def pop(self, exclude: Iterable[str] = ()) -> Optional[Tuple[str, Dict]]:
+        """Take the next (key, job) to print, skipping printers in exclude"""
+        now = time.monotonic()
+        best = None
+        for key in self._queues:
+            if key in exclude:
+                continue
+            head = self._head(key, now)
+            if head is None:
+                continue
+            rank = (head[0], self._vtime[key], head[1])
+            if best is None or rank < best[0]:
+                best = (rank, key, head[2])
+        if best is None:
+            return None
+        _, key, cls = best
+        return key, self._take(key, cls)
+
+    def pop_from(self, key: str) -> Optional[Dict]:
+        """Take the next job for one printer, if any"""
+        if key not in self._queues:
+            return None
+        head = self._head(key, time.monotonic())
+        return self._take(key, head[2]) if head else None
+
+    def _take(self, key: str, cls: int) -> Dict:
+        _, _, job = self._queues[key][cls].popleft()
+        self._size -= 1
+        self._vclock = self._vtime[key]
+        self._vtime[key] += self.job_cost(job) / self.weights.get(key, 1.0)
+        if not any(self._queues[key]):
+            del self._queues[key]
+        return job
+
+    def depth(self) -> Dict[str, int]:
+        """Queued job count per printer"""
+        return {key: sum(len(q) for q in queues) for key, queues in self._queues.items()}
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class PrintDispatcher:
+    """Schedules jobs onto a bounded pool of worker threads
+
+    A printer is served by at most one worker at a time; jobs for different
+    printers print in parallel. The JobScheduler picks which job goes next.
+    With a coalesce window and a batch handler, a worker that picks a
+    direct-IP job waits up to the window for more jobs for the same printer
+    and hands them over together.
+    """
+
+    def __init__(self, handler: Callable[[Dict], Any], max_workers: int = 3,
+                 scheduler: Optional[JobScheduler] = None,
+                 batch_handler: Optional[Callable[[List[Dict]], Any]] = None,
+                 coalesce_window: float = 0.0, coalesce_max: int = 10):
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.max_workers = max(1, max_workers)
+        self.scheduler = scheduler or JobScheduler()
+        self.coalesce_window = coalesce_window
+        self.coalesce_max = max(1, coalesce_max)
+        self._busy_keys = set()
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+    @staticmethod
+    def printer_key(job: Dict) -> str:
+        """Queue key for a job: host:port for direct IP, else printer name"""
+        printer_ip = job.get('printerIp')
+        if printer_ip:
+            return f"{printer_ip}:{job.get('printerPort', 9100)}"
+        return job.get('printer', 'main')
+
+    def start(self):
+        """Start worker threads"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._worker, name=f"print-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Dispatcher started with {self.max_workers} worker(s)")
+
+    def submit(self, job: Dict):
+        """Queue a job for its printer"""
+        key = self.printer_key(job)
+        with self._cond:
+            self.scheduler.submit(key, job)
+            # notify_all so a worker collecting a coalesce batch also sees it
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        """Number of queued and in-flight jobs"""
+        with self._cond:
+            return len(self.scheduler) + self._inflight
+
+    def depth(self) -> Dict[str, int]:
+        """Queued job count per printer"""
+        with self._cond:
+            return self.scheduler.depth()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all submitted jobs have been handled"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while len(self.scheduler) or self._busy_keys:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """Drain queued jobs (up to timeout) and stop the workers"""
+        if not self.join(timeout):
+            logger.warning(f"Dispatcher stopped with {self.pending()} job(s) still queued")
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    picked = self.scheduler.pop(exclude=self._busy_keys)
+                    if picked:
+                        break
+                    self._cond.wait()
+                key, job = picked
+                self._busy_keys.add(key)
+                jobs = [job]
+                if self.batch_handler and self.coalesce_window > 0 and job.get('printerIp'):
+                    self._collect_batch(key, jobs)
+                self._inflight += len(jobs)
+
+            try:
+                if len(jobs) == 1:
+                    self.handler(job)
+                else:
+                    self.batch_handler(jobs)
+            except Exception as e:
+                logger.error(f"Unhandled error processing job {job.get('id')} for {key}: {e}")
+
+            with self._cond:
+                self._inflight -= len(jobs)
+                self._busy_keys.discard(key)
+                # Wake everyone: this printer's next job and join() may both be waiting
+                self._cond.notify_all()
+
+
+    def _collect_batch(self, key: str, jobs: List[Dict]):
+        # Called with the lock held; waiting releases it so submit() can add jobs
+        deadline = time.monotonic() + self.coalesce_window
+        while len(jobs) < self.coalesce_max:
+            job = self.scheduler.pop_from(key)
+            if job is not None:
+                jobs.append(job)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._running:
+                return
+            self._cond.wait(remaining)
+
+
+class CircuitBreaker:
+    """Per-printer circuit breaker
+
+    Closed: jobs go through. After `threshold` consecutive failures it opens
+    and jobs fail fast for `reset_timeout` seconds. It then turns half-open
+    and lets one job through as a trial: success closes it, failure opens it
+    again for twice as long (capped at max_timeout). A trial that ends with
+    neither outcome (bad payload, exception) must be handed back with
+    release_trial() so the next job can try.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold: int = 3, reset_timeout: float = 30.0, max_timeout: float = 300.0):
+        self.threshold = max(1, threshold)
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max(max_timeout, reset_timeout)
+        self.failures = 0
+        self.trips = 0
+        self._timeout = reset_timeout
+        self._opened_at = 0.0
+        # Thread running the half-open trial, if any
+        self._trial: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.failures < self.threshold:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self._timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a job may be sent now; in half-open state only one at a time"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trial is None:
+                self._trial = threading.get_ident()
+                return True
+            return False
+
+    def release_trial(self):
+        """End the calling thread's trial without an outcome; no-op otherwise"""
+        with self._lock:
+            if self._trial == threading.get_ident():
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial = None
+            self._timeout = self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            if self._trial is not None:
+                # Failed trial: back off further before the next one
+                self._timeout = min(self._timeout * 2, self.max_timeout)
+            self._trial = None
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.failures == self.threshold:
+                    self.trips += 1
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state()
+            return {
+                'state': state,
+                'failures': self.failures,
+                'trips': self.trips,
+                'retry_in': round(max(0.0, self._opened_at + self._timeout - time.monotonic()), 1)
+                if state == self.OPEN else 0.0,
+            }
+
+
+class DelayQueue:
+    """Jobs waiting out a retry backoff, handed to submit() once due
+
+    Replaces sleeping in the worker: the worker moves on to other printers
+    while the job waits here. Jobs still waiting at shutdown stay unfinished
+    in the journal and are recovered on the next start.
+    """
+
+    def __init__(self, submit: Callable[[Dict], Any]):
+        self.submit = submit
+        self.running = False
+        self._heap: List[Tuple[float, int, Dict]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def add(self, job: Dict, delay: float):
+        """Submit job after delay seconds"""
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+            self._cond.notify()
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self.running = True
+        self._thread = threading.Thread(target=self._run, name='retry-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> int:
+        """Stop releasing jobs; returns how many were still waiting"""
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+            waiting = len(self._heap)
+        if self._thread:
+            self._thread.join(timeout=5)
+        return waiting
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if not self.running:
+                    return
+                due = []
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            for job in due:
+                self.submit(job)
+
+
+class JobJournal:
+    """Append-only journal of job states for crash recovery and dedup
+
+    Each line records one state change: received (with the job payload),
+    sent (printed), failed (with the error) or acked (the API knows the
+    outcome). An in-memory index keeps the latest state per job, with the
+    most recent max_acked acked ids and their outcome retained for
+    duplicate suppression.
+    After compact_records appends the file is rewritten from the index, so
+    its size stays bounded on tmpfs or flash.
+    """
+
+    RECEIVED = 'r'
+    SENT = 's'
+    FAILED = 'f'
+    ACKED = 'a'
+
+    def __init__(self, path: str, max_acked: int = 5000, compact_records: int = 2000):
+        self.path = path
+        self.max_acked = max_acked
+        self.compact_records = compact_records
+        self._states: Dict[str, str] = {}
+        self._jobs: Dict[str, Dict] = {}
+        self._errors: Dict[str, str] = {}
+        # Acked job id -> None if it printed, else its error
+        self._acked: OrderedDict = OrderedDict()
+        self._file = None
+        self._appended = 0
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Load the journal from disk, compact it and open it for appending"""
+        loaded = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        continue
+                    self._apply(record['i'], record['s'], record.get('j'), record.get('e'))
+                    loaded += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to read job journal {self.path}: {e}")
+        with self._lock:
+            self._compact()
+        if loaded:
+            logger.info(f"Loaded job journal: {len(self._states)} open job(s), "
+                        f"{len(self._acked)} recently acked")
+
+    def close(self):
+        """Close the journal file"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def seen(self, job_id: str) -> bool:
+        """True if the job has been received before"""
+        return job_id in self._states or job_id in self._acked
+
+    def outcome(self, job_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """How a finished job ended: (SENT, None) or (FAILED, error); None if still open or unknown"""
+        with self._lock:
+            if job_id in self._acked:
+                error = self._acked[job_id]
+                return (self.SENT, None) if error is None else (self.FAILED, error)
+            state = self._states.get(job_id)
+            if state == self.SENT:
+                return state, None
+            if state == self.FAILED:
+                return state, self._errors.get(job_id, '')
+        return None
+
+    def record(self, job_id: str, state: str, job: Optional[Dict] = None, error: Optional[str] = None):
+        """Record a state change for a job"""
+        record = {'i': job_id, 's': state}
+        if job is not None:
+            record['j'] = job
+        if error is not None:
+            record['e'] = error
+        with self._lock:
+            self._apply(job_id, state, job, error)
+            if self._file:
+                try:
+                    self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+                    self._file.flush()
+                except OSError as e:
+                    logger.warning(f"Failed to write job journal: {e}")
+                self._appended += 1
+                if self._appended >= self.compact_records:
+                    self._compact()
+
+    def unfinished(self) -> Tuple[List[Dict], List[str], List[Tuple[str, str]]]:
+        """Jobs not yet acked: (received payloads, sent ids, (failed id, error) pairs)"""
+        with self._lock:
+            received = [self._jobs[job_id] for job_id, state in self._states.items()
+                        if state == self.RECEIVED and job_id in self._jobs]
+            sent = [job_id for job_id, state in self._states.items() if state == self.SENT]
+            failed = [(job_id, self._errors.get(job_id, '')) for job_id, state in self._states.items()
+                      if state == self.FAILED]
+        return received, sent, failed
+
+    def _apply(self, job_id: str, state: str, job: Optional[Dict], error: Optional[str]):
+        if state == self.ACKED:
+            self._states.pop(job_id, None)
+            self._jobs.pop(job_id, None)
+            self._errors.pop(job_id, None)
+            self._acked[job_id] = error
+            self._acked.move_to_end(job_id)
+            while len(self._acked) > self.max_acked:
+                self._acked.popitem(last=False)
+            return
+        self._states[job_id] = state
+        if job is not None:
+            self._jobs[job_id] = job
+        if state != self.RECEIVED:
+            # The payload is only needed to reprint jobs that never reached the printer
+            self._jobs.pop(job_id, None)
+        if error is not None:
+            self._errors[job_id] = error
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            if self._file:
+                self._file.close()
+                self._file = None
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for job_id, error in self._acked.items():
+                    record = {'i': job_id, 's': self.ACKED}
+                    if error is not None:
+                        record['e'] = error
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                for job_id, state in self._states.items():
+                    record = {'i': job_id, 's': state}
+                    if job_id in self._jobs:
+                        record['j'] = self._jobs[job_id]
+                    if job_id in self._errors:
+                        record['e'] = self._errors[job_id]
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to compact job journal {self.path}: {e}")
+        self._appended = 0
+        try:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Failed to open job journal {self.path}: {e}")
+
+
+class AckQueue:
+    """Batches job complete/fail acknowledgements and sends them in the background
+
+    Acks are flushed when batch_size are pending or flush_interval has passed,
+    via the bulk endpoint if the API has one and per-job calls otherwise.
+    Every queued ack is appended to a file until delivered, so acks still
+    pending at shutdown or after a crash are replayed on the next start.
+    """
+
+    BULK_ENDPOINT = '/api/print-server/jobs/ack'
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self, server: 'PrintServer', path: str, batch_size: int = 20,
+                 flush_interval: float = 1.0):
+        self.server = server
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.bulk_supported: Optional[bool] = None
+        self.on_delivered: Optional[Callable[[Dict], None]] = None
+        self._pending: List[Dict] = []
+        self._cond = threading.Condition()
+        self._file_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._woken = False
+
+    def load(self) -> int:
+        """Queue acks left over from a previous run"""
+        acks = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        acks.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        logger.warning(f"Skipping unreadable line in {self.path}")
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.error(f"Failed to read pending acks from {self.path}: {e}")
+            return 0
+        with self._cond:
+            self._pending = acks + self._pending
+        if acks:
+            logger.info(f"Replaying {len(acks)} acknowledgement(s) from previous run")
+        return len(acks)
+
+    def complete(self, job_id: str):
+        """Queue a job as printed"""
+        self._put({'id': job_id, 'status': 'complete'})
+
+    def fail(self, job_id: str, error_message: str):
+        """Queue a job as failed"""
+        self._put({'id': job_id, 'status': 'fail', 'errorMessage': error_message})
+
+    def pending(self) -> int:
+        """Number of acks not yet delivered"""
+        with self._cond:
+            return len(self._pending)
+
+    def wake(self):
+        """Flush now, e.g. once the API is reachable again"""
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
+
+    def pending_ids(self) -> set:
+        """Job ids with an ack not yet delivered"""
+        with self._cond:
+            return set(ack['id'] for ack in self._pending)
+
+    def _put(self, ack: Dict):
+        with self._cond:
+            self._pending.append(ack)
+            self._append_to_file(ack)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _append_to_file(self, ack: Dict):
+        try:
+            with self._file_lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(ack) + '\n')
+        except OSError as e:
+            logger.warning(f"Failed to persist ack for job {ack['id']}: {e}")
+
+    def _rewrite_file(self):
+        # Same lock order as _put, which appends under both: an ack queued
+        # between taking the copy and writing it would otherwise be lost
+        try:
+            with self._cond, self._file_lock:
+                if not self._pending:
+                    if os.path.exists(self.path):
+                        os.remove(self.path)
+                    return
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for ack in self._pending:
+                        f.write(json.dumps(ack) + '\n')
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to rewrite ack file {self.path}: {e}")
+
+    def start(self):
+        """Start the background flush thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='ack-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Make a final delivery attempt; anything left stays on disk"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.flush()
+        remaining = self.pending()
+        if remaining:
+            logger.warning(f"{remaining} acknowledgement(s) saved to {self.path} for next start")
+
+    def _run(self):
+        delay = self.flush_interval
+        backing_off = False
+        while True:
+            with self._cond:
+                if backing_off:
+                    # A full batch must not cut the retry delay short, or an
+                    # unreachable API is hammered with back-to-back flushes
+                    deadline = time.monotonic() + delay
+                    while self._running and not self._woken:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                elif self._running and len(self._pending) < self.batch_size and not self._woken:
+                    self._cond.wait(delay)
+                if not self._running:
+                    return
+                self._woken = False
+            if self.flush():
+                delay = self.flush_interval
+                backing_off = False
+            else:
+                delay = min(max(delay, 1.0) * 2, self.MAX_RETRY_DELAY)
+                backing_off = True
+
+    def flush(self) -> bool:
+        """Deliver pending acks; returns False if the API could not be reached"""
+        with self._cond:
+            batch = self._pending[:self.batch_size * 5]
+        if not batch:
+            return True
+
+        delivered = self._deliver(batch)
+        with self._cond:
+            done = set(id(ack) for ack in batch[:delivered])
+            self._pending = [ack for ack in self._pending if id(ack) not in done]
+        if delivered:
+            self._rewrite_file()
+            if self.on_delivered:
+                for ack in batch[:delivered]:
+                    self.on_delivered(ack)
+        return delivered == len(batch)
+
+    def _deliver(self, batch: List[Dict]) -> int:
+        """Send acks in order, returning how many leading acks were handled"""
+        if self.bulk_supported is not False and len(batch) > 1:
+            status, result = self.server.api_call(self.BULK_ENDPOINT, method='POST', data={'acks': batch})
+            if status is None:
+                return 0
+            if status in (404, 405, 501):
+                logger.info("Bulk ack endpoint not available, acknowledging jobs individually")
+                self.bulk_supported = False
+            elif status < 400 and not (result or {}).get('error'):
+                self.bulk_supported = True
+                logger.info(f"Acknowledged {len(batch)} job(s) in bulk")
+                return len(batch)
+            else:
+                logger.warning(f"Bulk ack failed with HTTP {status}, acknowledging jobs individually")
+
+        for count, ack in enumerate(batch):
+            if not self._deliver_one(ack):
+                return count
+        return len(batch)
+
+    def _deliver_one(self, ack: Dict) -> bool:
+        job_id = ack['id']
+        label = 'complete' if ack['status'] == 'complete' else 'failed'
+        if ack['status'] == 'complete':
+            status, result = self.server.api_call(f'/api/print-server/jobs/{job_id}/complete', method='POST')
+        else:
+            status, result = self.server.api_call(
+                f'/api/print-server/jobs/{job_id}/fail',
+                method='POST',
+                data={'errorMessage': ack.get('errorMessage', '')}
+            )
+        if status is None or status >= 500:
+            logger.warning(f"Failed to mark order {job_id} as {label}, will retry")
+            return False
+        if status >= 400 or (result and result.get('error')):
+            # The API rejected this ack outright; retrying will not help
+            error_msg = result.get('message', 'Unknown error') if result else f"HTTP {status}"
+            logger.error(f"Failed to mark order {job_id} as {label}: {error_msg}")
+            return True
+        logger.info(f"Order {job_id} marked as {label}")
+        return True
+
+
+class MonitoringServer:
+    """HTTP endpoint serving /metrics (Prometheus text) and /health (JSON)"""
+
+    def __init__(self, server: 'PrintServer', host: str, port: int,
+                 metrics: bool = True, health: bool = True):
+        self.server = server
+        self.metrics = metrics
+        self.health = health
+        import http.server
+        self._httpd = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def _handler(self):
+        import http.server
+        monitor = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics' and monitor.metrics:
+                    body = METRICS.render().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                    code = 200
+                elif path == '/health' and monitor.health:
+                    health = monitor.server.health_status()
+                    body = json.dumps(health).encode('utf-8')
+                    content_type = 'application/json'
+                    code = 200 if health['status'] == 'ok' else 503
+                else:
+                    body = b'Not found\n'
+                    content_type = 'text/plain'
+                    code = 404
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Monitoring request: {format % args}")
+
+        return Handler
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='monitoring', daemon=True)
+        self._thread.start()
+        host, port = self._httpd.server_address[:2]
+        logger.info(f"Monitoring endpoint listening on {host}:{port}")
+
+    def stop(self):
+        """Stop serving"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class LocalIntakeServer:
+    """LAN HTTP intake: tills POST jobs here to keep printing when the cloud is down
+
+    POST /jobs with {"jobs": [...]} or a single job object, authenticated
+    with the X-API-Key header.
+    """
+
+    MAX_BODY = 4 * 1024 * 1024
+
+    def __init__(self, server: 'PrintServer', host: str, port: int, api_key: str):
+        self.server = server
+        self.api_key = api_key
+        import http.server
+        self._httpd = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def _handler(self):
+        import http.server
+        intake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def _reply(self, code: int, payload: Dict):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.split('?', 1)[0].rstrip('/') != '/jobs':
+                    self._reply(404, {'error': 'Not found'})
+                    return
+                if not intake.api_key or self.headers.get('X-API-Key') != intake.api_key:
+                    self._reply(401, {'error': 'Unauthorized'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                except ValueError:
+                    self._reply(400, {'error': 'Invalid Content-Length'})
+                    return
+                if length <= 0 or length > intake.MAX_BODY:
+                    self._reply(413 if length > 0 else 400, {'error': 'Invalid body size'})
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(length).decode('utf-8'))
+                except ValueError:
+                    self._reply(400, {'error': 'Invalid JSON'})
+                    return
+                jobs = payload.get('jobs', [payload]) if isinstance(payload, dict) else payload
+                if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+                    self._reply(400, {'error': 'Expected a job object or {"jobs": [...]}'})
+                    return
+                accepted = intake.server.submit_local_jobs(jobs)
+                self._reply(202, {'accepted': accepted, 'duplicates': len(jobs) - accepted,
+                                  'ids': [job.get('id') for job in jobs]})
+
+            def log_message(self, format, *args):
+                logger.debug(f"Local intake request: {format % args}")
+
+        return Handler
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='local-intake', daemon=True)
+        self._thread.start()
+        host, port = self._httpd.server_address[:2]
+        logger.info(f"Local job intake listening on {host}:{port}")
+
+    def stop(self):
+        """Stop serving"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class JobFeed:
+    """Incremental fetch state for one jobs endpoint
+
+    Remembers the API's cursor for the newest job seen and the ETag of the
+    last response, which is sent back as If-None-Match.
+    """
+
+    def __init__(self, path: str, headers: Dict[str, str]):
+        self.path = path
+        self.headers = dict(headers)
+        self.cursor: Optional[str] = None
+        self._endpoints: Dict[Optional[int], str] = {}
+
+    def endpoint(self, wait: Optional[int] = None, lazy_data: bool = False) -> str:
+        """Request path for the next fetch"""
+        endpoint = self._endpoints.get(wait)
+        if endpoint is None:
+            endpoint = self.path
+            if wait:
+                endpoint += f'&wait={wait}'
+            if lazy_data:
+                endpoint += '&include_data=false'
+            self._endpoints[wait] = endpoint
+        if self.cursor:
+            import urllib.parse
+            endpoint += '&since=' + urllib.parse.quote(self.cursor, safe='')
+        return endpoint
+
+    def update(self, status: Optional[int], headers: Dict[str, str], response: Any):
+        """Take the ETag and cursor from a response"""
+        if status != 200:
+            return
+        if headers.get('etag'):
+            self.headers['If-None-Match'] = headers['etag']
+        else:
+            self.headers.pop('If-None-Match', None)
+        if isinstance(response, dict) and response.get('cursor') is not None:
+            self.cursor = str(response['cursor'])
+
+
+class EventContext:
+    """Settings, receipt template and job feed of one event"""
+
+    def __init__(self, event_id: str, headers: Dict[str, str]):
+        self.event_id = event_id
+        self.settings: Dict[str, Any] = {}
+        self.template = ReceiptTemplate()
+        self.feed = JobFeed(f'/api/print-server/events/{event_id}/jobs?mark_as_printing=true', headers)
+
+
+class PollJobSource:
+    """Fixed-interval polling of the jobs endpoint"""
+
+    def __init__(self, server: 'PrintServer'):
+        self.server = server
+        self.config = server.config
+
+    def fetch(self) -> List[Dict]:
+        """Fetch the next batch of jobs"""
+        return self.server.poll_for_jobs()
+
+    def wait(self, found: int):
+        """Pause before the next fetch"""
+        # With several events polled in turn, each still gets one poll per interval
+        time.sleep(self.config['poll_interval'] / self.server.poll_slots)
+
+
+class AdaptivePollJobSource(PollJobSource):
+    """Polls fast while jobs keep arriving and backs off while idle"""
+
+    def __init__(self, server: 'PrintServer'):
+        super().__init__(server)
+        self.interval = self.config['poll_interval_min']
+
+    def wait(self, found: int):
+        if found:
+            self.interval = self.config['poll_interval_min']
+        else:
+            self.interval = min(self.interval * 1.5, self.config['poll_interval_max'])
+        time.sleep(self.interval / self.server.poll_slots)
+
+
+class LongPollJobSource(PollJobSource):
+    """Asks the API to hold the jobs request open until work is available"""
+
+    def __init__(self, server: 'PrintServer'):
+        super().__init__(server)
+        self.last_fetch_time = 0.0
+
+    def fetch(self) -> List[Dict]:
+        if self.server.poll_slots > 1:
+            # Holding one event's request open would starve the others
+            return super().fetch()
+        started = time.monotonic()
+        jobs = self.server.poll_for_jobs(wait=self.config['long_poll_timeout'])
+        self.last_fetch_time = time.monotonic() - started
+        return jobs
+
+    def wait(self, found: int):
+        if self.server.poll_slots > 1:
+            super().wait(found)
+        # An empty answer well before the wait expired means the API does not
+        # hold requests open, so fall back to plain polling instead of spinning
+        elif not found and self.last_fetch_time < self.config['long_poll_timeout'] / 2:
+            time.sleep(self.config['poll_interval'])
+
+
+JOB_SOURCES = {
+    'poll': PollJobSource,
+    'adaptive': AdaptivePollJobSource,
+    'longpoll': LongPollJobSource,
+}
+
+
 class PrintServer:
     """Main print server application"""
     
     def __init__(self):
         self.config = CONFIG
         self.printers: Dict[str, SimplePrinter] = {}
-        self.event_settings = {}
         self.running = False
-        self.last_job_id = None
-    
-    def make_api_request(self, endpoint: str, method: str = 'GET', data: Dict = None) -> Optional[Dict]:
-        """Make HTTP request to FriendlyPOS API"""
-        url = f"{self.config['api_url']}{endpoint}"
-        headers = {
+        self.api = ApiClient(self.config['api_url'],
+                             connect_timeout=self.config['api_connect_timeout'],
+                             read_timeout=self.config['api_read_timeout'],
+                             max_idle=self.config['max_workers'] + 1)
+        self.printer_pool = PrinterPool(self.config['printer_idle_timeout'])
+        self.images = ImageCache(self._fetch_image, self.config['image_cache_dir'],
+                                 memory_bytes=self.config['image_cache_bytes'],
+                                 disk_bytes=self.config['image_disk_cache_bytes'])
+        self.health = PrinterHealthMonitor(self.printer_pool,
+                                           interval=self.config['health_check_interval'],
+                                           ttl=self.config['printer_status_ttl'])
+        self.acks = AckQueue(self, self.config['ack_file'],
+                             batch_size=self.config['ack_batch_size'],
+                             flush_interval=self.config['ack_flush_interval'])
+        self.journal = JobJournal(self.config['journal_file'],
+                                  max_acked=self.config['journal_max_acked'],
+                                  compact_records=self.config['journal_compact_records'])
+        self.acks.on_delivered = self._ack_delivered
+        self.scheduler = JobScheduler(
+            weights={k: float(v) for k, v in self._parse_mapping(self.config['printer_weights']).items()},
+            station_priorities={
+                k: JobScheduler.CLASS_NAMES.get(v.lower(), JobScheduler.NORMAL)
+                for k, v in self._parse_mapping(self.config['station_priorities']).items()
+            },
+            large_job_bytes=self.config['large_job_bytes'],
+            aging=self.config['priority_aging'])
+        self.dispatcher = PrintDispatcher(self._handle_job, self.config['max_workers'], self.scheduler,
+                                          batch_handler=self._handle_batch,
+                                          coalesce_window=self.config['coalesce_window_ms'] / 1000.0,
+                                          coalesce_max=self.config['coalesce_max_jobs'])
+        self.delayed = DelayQueue(self.dispatcher.submit)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_poll_at: Optional[float] = None
+        self.api_online = True
+        self.local_intake: Optional[LocalIntakeServer] = None
+        self.monitoring: Optional[MonitoringServer] = None
+        self._fetched_at: Dict[str, float] = {}
+        # Reused by every API call and poll instead of being rebuilt each time
+        self._api_headers = {
             'X-API-Key': self.config['api_key'],
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip',
         }
         
-        req = urllib.request.Request(url, headers=headers, method=method)
+        # Events served by this process; they share the API client, printer
+        # pool and dispatcher but each has its own settings and template
+        event_ids = [e.strip() for e in (self.config['event_ids'] or self.config['event_id']).split(',')]
+        self.events: Dict[str, EventContext] = OrderedDict(
+            (event_id, EventContext(event_id, self._api_headers)) for event_id in event_ids if event_id)
+        self.primary_event = next(iter(self.events.values()), None) or EventContext('', self._api_headers)
+        self._event_cycle = itertools.cycle(list(self.events))
+        # One request for all events, if the API supports it
+        self._combined_feed: Optional[JobFeed] = None
+        if len(self.events) > 1 and self.config['event_poll_mode'] == 'combined':
+            import urllib.parse
+            self._combined_feed = JobFeed(
+                '/api/print-server/jobs?event_ids=' + urllib.parse.quote(','.join(self.events), safe=',')
+                + '&mark_as_printing=true', self._api_headers)
         
+        source_class = JOB_SOURCES.get(self.config['job_source'])
+        if source_class is None:
+            logger.warning(f"Unknown JOB_SOURCE '{self.config['job_source']}', using 'poll'")
+            source_class = PollJobSource
+        self.job_source = source_class(self)
+    
+    def make_api_request(self, endpoint: str, method: str = 'GET', data: Dict = None,
+                         timeout: Optional[float] = None) -> Optional[Dict]:
+        """Make HTTP request to FriendlyPOS API"""
+        return self.api_call(endpoint, method, data, timeout)[1]
+    
+    def api_call(self, endpoint: str, method: str = 'GET', data: Dict = None,
+                 timeout: Optional[float] = None) -> Tuple[Optional[int], Optional[Dict]]:
+        """Make HTTP request to FriendlyPOS API, returning (status, parsed body)
+
+        status is None when the API could not be reached at all.
+        """
+        status, _, body = self._api_request(endpoint, method, data, timeout)
+        return status, body
+    
+    def _api_request(self, endpoint: str, method: str = 'GET', data: Dict = None,
+                     timeout: Optional[float] = None, headers: Optional[Dict[str, str]] = None
+                     ) -> Tuple[Optional[int], Dict[str, str], Optional[Dict]]:
+        """api_call with custom request headers, also returning the response headers"""
+        body = None
         if data and method in ['POST', 'PATCH', 'PUT']:
-            req.data = json.dumps(data).encode('utf-8')
+            body = json.dumps(data).encode('utf-8')
         
+        started = time.monotonic()
         try:
-            with urllib.request.urlopen(req) as response:
-                return json.loads(response.read().decode('utf-8'))
-        except urllib.error.HTTPError as e:
-            logger.error(f"HTTP Error {e.code}: {e.reason} for {url}")
-            # Try to read error response body
-            try:
-                error_body = e.read().decode('utf-8')
-                return json.loads(error_body)
-            except:
-                return None
+            status, response_headers, payload = self.api.request(method, endpoint, body,
+                                                                 headers or self._api_headers, timeout=timeout)
         except Exception as e:
-            logger.error(f"API request failed for {url}: {e}")
-            return None
+            logger.error(f"API request failed for {self.config['api_url']}{endpoint}: {e}")
+            if METRICS.enabled:
+                METRICS.inc('api_requests_total', endpoint=self._endpoint_label(endpoint), status='error')
+            return None, {}, None
+        
+        if METRICS.enabled:
+            label = self._endpoint_label(endpoint)
+            METRICS.observe('api_request_seconds', time.monotonic() - started, endpoint=label)
+            METRICS.inc('api_requests_total', endpoint=label, status=str(status))
+        
+        if status >= 400:
+            import http.client
+            logger.error(f"HTTP Error {status}: {http.client.responses.get(status, '')} "
+                         f"for {self.config['api_url']}{endpoint}")
+        if status == 304:
+            return status, response_headers, None
+        try:
+            # json.loads takes bytes, saving a decoded copy of large job lists
+            return status, response_headers, json.loads(payload)
+        except ValueError:
+            if status < 400:
+                logger.error(f"Invalid JSON response for {self.config['api_url']}{endpoint}")
+            return status, response_headers, None
+    
+    @staticmethod
+    def _parse_mapping(value: str) -> Dict[str, str]:
+        """Parse 'a=1,b=2' style config values (keys may contain ':')"""
+        mapping = {}
+        for item in value.split(','):
+            key, sep, val = item.strip().rpartition('=')
+            if sep and key:
+                mapping[key.strip()] = val.strip()
+        return mapping
+    
+    @staticmethod
+    def _endpoint_label(endpoint: str) -> str:
+        """Endpoint path with ids replaced, for metric labels"""
+        parts = endpoint.split('?', 1)[0].split('/')
+        for i in range(1, len(parts)):
+            if parts[i - 1] in ('jobs', 'events') and parts[i] != 'ack':
+                parts[i] = '{id}'
+        return '/'.join(parts)
     
     def load_printers(self) -> bool:
         """Load printer configurations - kept for backward compatibility"""
@@ -227,23 +2568,218 @@ class PrintServer:
         logger.info("Using direct IP printing mode - no pre-configuration needed")
         return True
     
+    @property
+    def event_settings(self) -> Dict[str, Any]:
+        """Settings of the first configured event"""
+        return self.primary_event.settings
+    
+    @property
+    def receipt_template(self) -> ReceiptTemplate:
+        """Receipt template of the first configured event"""
+        return self.primary_event.template
+    
+    @property
+    def poll_slots(self) -> int:
+        """Separate job requests per poll interval: one per event unless combined"""
+        return 1 if self._combined_feed or len(self.events) <= 1 else len(self.events)
+    
+    def _event_for(self, order: Dict) -> EventContext:
+        """Event a job belongs to, by its eventId"""
+        return self.events.get(order.get('eventId')) or self.primary_event
+    
     def load_event_settings(self) -> bool:
         """Load event-specific settings from API"""
+        results = [self._load_settings(event) for event in self.events.values() or [self.primary_event]]
+        return all(results)
+    
+    def _load_settings(self, event: EventContext) -> bool:
+        """Load one event's settings and rebuild its receipt template"""
         try:
-            settings = self.make_api_request('/api/settings')
+            if len(self.events) > 1:
+                import urllib.parse
+                settings = self.make_api_request(f'/api/settings?event_id={urllib.parse.quote(event.event_id)}')
+            else:
+                settings = self.make_api_request('/api/settings')
             
             if settings:
-                self.event_settings = settings
+                # Rebuild on change, or to pick up a logo that failed to load last time
+                if settings != event.settings or (settings.get('logo') and not event.template.logo):
+                    event.settings = settings
+                    template = ReceiptTemplate(settings)
+                    if settings.get('logo'):
+                        logo = self.images.get(settings['logo'], self._image_width(template.width))
+                        if logo:
+                            template = ReceiptTemplate(settings, logo=logo)
+                    event.template = template
                 logger.info(f"Loaded event settings: {settings.get('event_name', 'Default')}")
                 return True
             
-            logger.warning("No event settings loaded, using defaults")
+            logger.warning(f"No event settings loaded for {event.event_id or 'event'}, using defaults")
             return True
             
         except Exception as e:
             logger.error(f"Failed to load event settings: {e}")
             return False
     
+    def _image_width(self, chars: int) -> int:
+        """Printable dots across the paper: 12 per Font A character"""
+        return self.config['image_max_width'] or chars * 12
+    
+    def _fetch_image(self, ref: str) -> Optional[bytes]:
+        """Download an image by reference: raw image bytes or JSON {"data": base64}"""
+        status, headers, payload = self.api.request('GET', f'/api/print-server/images/{ref}',
+                                                    headers=self._api_headers)
+        if status != 200:
+            raise ValueError(f"HTTP {status}")
+        if headers.get('content-type', '').startswith('application/json'):
+            return binascii.a2b_base64(json.loads(payload).get('data') or '')
+        return payload
+    
+    def _job_images(self, order: Dict) -> bytes:
+        """Raster commands for the images a job references, printed above it
+
+        Jobs list them as "images": ["<ref>", ...]. An image that cannot be
+        loaded is left out rather than failing the ticket.
+        """
+        refs = order.get('images')
+        if not refs or not isinstance(refs, list):
+            return b''
+        width = self._image_width(self._event_for(order).template.width)
+        parts = []
+        for ref in refs:
+            if isinstance(ref, dict):
+                ref = ref.get('ref')
+            image = self.images.get(ref, width)
+            if image is None:
+                logger.warning(f"Printing order {order.get('id')} without image {ref}")
+                continue
+            parts.append(image.escpos())
+            parts.append(ESCPOSCommands.LINE_FEED)
+        if not parts:
+            return b''
+        cmd = ESCPOSCommands
+        return b''.join([cmd.INIT, cmd.ALIGN_CENTER] + parts + [cmd.ALIGN_LEFT])
+    
+    def _load_print_data(self, order: Dict) -> Optional[int]:
+        """Fetch a job's printData if the poll left it out (LAZY_PRINT_DATA)
+
+        Jobs announce a deferred payload with "hasPrintData": true. Returns
+        200 once the job can be printed, otherwise the status of the failed
+        fetch (None if the API could not be reached).
+        """
+        if order.get('printData') or not order.get('hasPrintData'):
+            return 200
+        status, response = self.api_call(f"/api/print-server/jobs/{order['id']}/data")
+        if status == 200 and isinstance(response, dict) and response.get('printData'):
+            order['printData'] = response['printData']
+            return 200
+        logger.error(f"Failed to fetch print data for order {order.get('id')} (status {status})")
+        # A 200 without a payload is retried like a server error
+        return 500 if status == 200 else status
+    
+    def _print_data_unavailable(self, order: Dict, status: Optional[int]):
+        """Fail a job whose deferred printData is gone (404), retry it otherwise
+
+        While the API is unreachable the job waits on the retry queue without
+        using up attempts; it stays received in the journal meanwhile, so a
+        restart picks it up again.
+        """
+        if status == 404:
+            if order.get('id'):
+                self._job_failed(order, "Print data unavailable")
+        elif status is None:
+            if self.delayed.running:
+                self.delayed.add(order, self._retry_delay(self.config['retry_attempts']))
+        else:
+            self._attempt_failed(order, f"Print data unavailable (status {status})")
+    
+    def _order_body(self, order: Dict, printer_key: Optional[str] = None) -> Iterable[bytes]:
+        """printData or a formatted receipt for one job, without its images
+
+        Raises if the payload is invalid or the receipt cannot be rendered;
+        printer_key (host:port) selects the printer's NV logo if it has one.
+        """
+        if order.get('printData'):
+            return SimplePrinter.iter_base64(order['printData'])
+        template = self._event_for(order).template
+        nv_logo = (printer_key is not None and template.logo is not None
+                   and self.images.nv_image(printer_key) == template.logo.ref)
+        return (template.render(order, nv_logo=nv_logo),)
+    
+    def _order_chunks(self, order: Dict, printer: Optional[SimplePrinter] = None,
+                      images: Optional[bytes] = None, body: Optional[Iterable[bytes]] = None) -> Iterable[bytes]:
+        """ESC/POS stream for one job: its images, then printData or a formatted receipt
+
+        Pass the job's images from _job_images when a pooled printer is held:
+        fetching and dithering them mid-transmission would stall the printer.
+        """
+        if body is None:
+            body = self._order_body(order, f"{printer.host}:{printer.port}" if printer is not None else None)
+        if images is None:
+            images = self._job_images(order)
+        return itertools.chain((images,), body) if images else body
+    
+    def _prepare_printer(self, printer: SimplePrinter, order: Dict):
+        """Store the order's event logo in the printer's NV memory if enabled and not done yet"""
+        logo = self._event_for(order).template.logo
+        if not self.config['image_nv_logo'] or logo is None:
+            return
+        key = f"{printer.host}:{printer.port}"
+        stored = self.images.nv_image(key)
+        if stored == logo.ref:
+            return
+        if stored and any(event.template.logo and event.template.logo.ref == stored
+                          for event in self.events.values()):
+            # A printer shared by events keeps the first logo; the others are
+            # sent as raster data rather than rewriting NV memory each ticket
+            return
+        try:
+            data = logo.nv_define()
+        except ValueError as e:
+            logger.warning(f"Not storing logo {logo.ref} in NV memory: {e}")
+            return
+        if printer.send(data):
+            logger.info(f"Stored logo {logo.ref} in NV memory of printer {key}")
+            self.images.set_nv_image(key, logo.ref)
+    
+    def _breaker(self, key: str) -> CircuitBreaker:
+        """Circuit breaker for a printer (host:port)"""
+        with self._breakers_lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.config['breaker_failures'],
+                                                               self.config['breaker_reset'])
+            return breaker
+    
+    def _retry_delay(self, attempt: int) -> float:
+        """Exponential backoff from RETRY_DELAY, capped and jittered"""
+        delay = min(self.config['retry_delay'] * 2 ** min(attempt - 1, 10), self.config['retry_delay_max'])
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _attempt_failed(self, order: Dict, error_msg: str):
+        """Put a job whose print attempt failed back on the delay queue, or fail it for good
+
+        Without a running delay queue (shutting down) a job with attempts
+        left stays received in the journal and is retried on the next start.
+        """
+        attempt = order.get('_attempt', 1)
+        if attempt < self.config['retry_attempts']:
+            if not self.delayed.running:
+                logger.warning(f"{error_msg}; leaving order {order.get('id')} for the next start")
+                return
+            delay = self._retry_delay(attempt)
+            order['_attempt'] = attempt + 1
+            logger.warning(f"{error_msg}; retrying order {order.get('id')} in {delay:.1f}s "
+                           f"(attempt {attempt + 1}/{self.config['retry_attempts']})")
+            if METRICS.enabled:
+                METRICS.inc('job_retries_total', printer=PrintDispatcher.printer_key(order))
+            self.delayed.add(order, delay)
+            return
+        if attempt > 1:
+            error_msg = f"{error_msg} after {attempt} attempts"
+        if order.get('id'):
+            self._job_failed(order, error_msg)
+    
     def _is_private_ip(self, ip: str) -> bool:
         """Check if IP address is in private network range"""
         try:
@@ -275,28 +2811,105 @@ class PrintServer:
         except (ValueError, IndexError):
             return False
     
-    def poll_for_jobs(self) -> List[Dict]:
-        """Check API for pending print jobs"""
+    def _accept_jobs(self, jobs: List[Dict]) -> List[Dict]:
+        """Drop jobs already seen and journal the rest as received
+
+        A finished job served again (its ack was lost, or it was re-queued
+        under the same id) is not reprinted, but its outcome is acked again
+        so the API stops showing it as printing.
+        """
+        new_jobs = []
+        pending_acks = None
+        for job in jobs:
+            job_id = job.get('id')
+            if job_id:
+                if self.journal.seen(job_id):
+                    outcome = self.journal.outcome(job_id)
+                    if outcome is not None:
+                        if pending_acks is None:
+                            pending_acks = self.acks.pending_ids()
+                        if job_id not in pending_acks:
+                            logger.info(f"Job {job_id} already finished, acknowledging it again")
+                            if outcome[0] == JobJournal.SENT:
+                                self.acks.complete(job_id)
+                            else:
+                                self.acks.fail(job_id, outcome[1])
+                            pending_acks.add(job_id)
+                            continue
+                    logger.debug(f"Skipping duplicate job {job_id}")
+                    continue
+                self.journal.record(job_id, JobJournal.RECEIVED, job=job)
+                if METRICS.enabled:
+                    self._fetched_at[job_id] = time.monotonic()
+            new_jobs.append(job)
+        return new_jobs
+    
+    def submit_local_jobs(self, jobs: List[Dict]) -> int:
+        """Queue jobs posted by a LAN client; returns how many were new
+
+        Jobs without an id get a local one and are never acked to the API.
+        The same job arriving later from the cloud is dropped as a duplicate.
+        """
+        for job in jobs:
+            if not job.get('id'):
+                job['id'] = f"local-{int(time.time() * 1000)}-{random.randrange(1 << 30):x}"
+                job['localOnly'] = True
+        new_jobs = self._accept_jobs(jobs)
+        if TRACE.enabled and new_jobs:
+            TRACE.record('local', jobs=[TraceRecorder.job_summary(job) for job in new_jobs])
+        for job in new_jobs:
+            self.dispatcher.submit(job)
+        if new_jobs:
+            logger.info(f"Accepted {len(new_jobs)} local print job(s)")
+        return len(new_jobs)
+    
+    def poll_for_jobs(self, wait: Optional[int] = None) -> List[Dict]:
+        """Check API for pending print jobs, optionally long-polling up to wait seconds
+
+        With several events, each call polls the next event in turn, or all
+        of them in one request in combined mode.
+        """
         try:
-            event_id = self.config.get('event_id')
-            if not event_id:
+            if not self.events:
                 logger.error("EVENT_ID not configured")
                 return []
 
-            endpoint = f'/api/print-server/events/{event_id}/jobs?mark_as_printing=true'
-            response = self.make_api_request(endpoint)
+            if self._combined_feed:
+                feed, event_id = self._combined_feed, None
+            else:
+                event = self.events[next(self._event_cycle)]
+                feed, event_id = event.feed, event.event_id
+
+            endpoint = feed.endpoint(wait, self.config['lazy_print_data'])
+            timeout = wait + 10 if wait else None
+            started = time.monotonic()
+            status, headers, response = self._api_request(endpoint, timeout=timeout, headers=feed.headers)
+            # Only polls decide online/offline, so a failed ack or data fetch
+            # elsewhere can't send the main loop into offline backoff
+            self.api_online = status is not None
+            if TRACE.enabled:
+                jobs = response.get('jobs') if isinstance(response, dict) else None
+                TRACE.record('poll', d=round(time.monotonic() - started, 4), s=status, ev=event_id,
+                             jobs=[TraceRecorder.job_summary(job) for job in jobs or () if isinstance(job, dict)])
+            if status == 304:
+                # Nothing changed since the last poll
+                return []
+            if status == 404 and feed is self._combined_feed:
+                logger.warning("API has no combined jobs endpoint, polling events one at a time")
+                self._combined_feed = None
+                return []
+            feed.update(status, headers, response)
 
             if response and isinstance(response, dict) and 'jobs' in response:
                 jobs = response.get('jobs', [])
-                new_jobs = []
-                for job in jobs:
-                    if job.get('id') != self.last_job_id:
-                        new_jobs.append(job)
-                        if job.get('id'):
-                            self.last_job_id = job['id']
+                if event_id and len(self.events) > 1:
+                    for job in jobs:
+                        job.setdefault('eventId', event_id)
+                new_jobs = self._accept_jobs(jobs)
 
                 if new_jobs:
-                    logger.info(f"Found {len(new_jobs)} new print job(s)")
+                    logger.info(f"Found {len(new_jobs)} new print job(s)"
+                                + (f" for event {event_id}" if event_id and len(self.events) > 1 else ""))
 
                 return new_jobs
 
@@ -306,9 +2919,270 @@ class PrintServer:
             logger.error(f"Failed to poll for print jobs: {e}")
             return []
     
+    def _handle_job(self, order: Dict) -> bool:
+        """Dispatcher entry point: process_order plus timing"""
+        if not METRICS.enabled and not TRACE.enabled:
+            return self.process_order(order)
+        started = time.monotonic()
+        success = self.process_order(order)
+        elapsed = time.monotonic() - started
+        if METRICS.enabled:
+            METRICS.observe('job_process_seconds', elapsed)
+            METRICS.inc('jobs_total', result='printed' if success else 'failed')
+        if TRACE.enabled:
+            TRACE.record('job', id=order.get('id'), ok=success, d=round(elapsed, 4))
+        return success
+    
+    def _handle_batch(self, orders: List[Dict]) -> List[bool]:
+        """Dispatcher entry point for coalesced jobs: process_batch plus timing"""
+        if not METRICS.enabled and not TRACE.enabled:
+            return self.process_batch(orders)
+        started = time.monotonic()
+        results = self.process_batch(orders)
+        elapsed = time.monotonic() - started
+        if METRICS.enabled:
+            METRICS.observe('batch_process_seconds', elapsed)
+            METRICS.inc('batches_total')
+            METRICS.inc('jobs_total', results.count(True), result='printed')
+            METRICS.inc('jobs_total', results.count(False), result='failed')
+        if TRACE.enabled:
+            for order, success in zip(orders, results):
+                TRACE.record('job', id=order.get('id'), ok=success, d=round(elapsed, 4), n=len(orders))
+        return results
+    
+    def _ack_delivered(self, ack: Dict):
+        """Called by the ack queue once the API has a job's outcome"""
+        error = ack.get('errorMessage', '') if ack.get('status') == 'fail' else None
+        self.journal.record(ack['id'], JobJournal.ACKED, error=error)
+        fetched_at = self._fetched_at.pop(ack['id'], None)
+        if fetched_at is not None and METRICS.enabled:
+            METRICS.observe('job_end_to_end_seconds', time.monotonic() - fetched_at)
+    
+    def _register_gauges(self):
+        METRICS.gauge('queue_depth', self.dispatcher.pending)
+        METRICS.gauge('printer_queue_depth', lambda: {
+            (('printer', key),): depth for key, depth in self.dispatcher.depth().items()
+        })
+        METRICS.gauge('acks_pending', self.acks.pending)
+        METRICS.gauge('jobs_delayed', lambda: len(self.delayed))
+        METRICS.gauge('printer_breaker_open', lambda: {
+            (('printer', key),): int(breaker.state != CircuitBreaker.CLOSED)
+            for key, breaker in list(self._breakers.items())
+        })
+        METRICS.gauge('api_handshakes', lambda: self.api.get_stats()['handshakes'])
+        METRICS.gauge('api_reconnects', lambda: self.api.get_stats()['reconnects'])
+        METRICS.gauge('printer_ready', lambda: {
+            (('printer', key),): int(status['ready']) for key, status in self.health.snapshot().items()
+        })
+        METRICS.gauge('printer_bytes_per_second', lambda: {
+            (('printer', key),): stats['bytes_per_second'] for key, stats in self.printer_pool.stats().items()
+        })
+    
+    def health_status(self) -> Dict[str, Any]:
+        """Summary served on /health"""
+        poll_age = None if self.last_poll_at is None else time.time() - self.last_poll_at
+        # Unhealthy if the poll loop has not completed a cycle for a while
+        stale = poll_age is not None and poll_age > max(60, self.config['long_poll_timeout'] * 2)
+        return {
+            'status': 'ok' if self.running and not stale else 'degraded',
+            'uptime': round(time.time() - self.started_at, 1),
+            'last_poll_age': None if poll_age is None else round(poll_age, 1),
+            'queue_depth': self.dispatcher.pending(),
+            'printer_queues': self.dispatcher.depth(),
+            'acks_pending': self.acks.pending(),
+            'api_online': self.api_online,
+            'events': list(self.events),
+            'retries_pending': len(self.delayed),
+            'breakers': {key: breaker.snapshot() for key, breaker in list(self._breakers.items())},
+            'api': self.api.get_stats(),
+            'printers': {
+                key: {k: v for k, v in status.items() if k != 'checked_at'}
+                for key, status in self.health.snapshot().items()
+            },
+        }
+    
+    def _job_printed(self, order: Dict):
+        """Record a printed job and queue its completion ack"""
+        if order.get('localOnly'):
+            self._ack_delivered({'id': order['id']})
+            return
+        self.journal.record(order['id'], JobJournal.SENT)
+        self.acks.complete(order['id'])
+    
+    def _job_failed(self, order: Dict, error_msg: str):
+        """Record a failed job and queue its failure ack"""
+        if order.get('localOnly'):
+            logger.error(f"Local job {order['id']} failed: {error_msg}")
+            self._ack_delivered({'id': order['id']})
+            return
+        self.journal.record(order['id'], JobJournal.FAILED, error=error_msg)
+        self.acks.fail(order['id'], error_msg)
+    
+    def recover_jobs(self):
+        """Finish jobs left open by a previous run
+
+        Jobs that were received but never printed are dispatched again; jobs
+        already printed or failed get their ack re-queued if it was lost.
+        """
+        received, sent, failed = self.journal.unfinished()
+        pending = self.acks.pending_ids()
+        for job_id in sent:
+            if job_id not in pending:
+                self.acks.complete(job_id)
+        for job_id, error_msg in failed:
+            if job_id not in pending:
+                self.acks.fail(job_id, error_msg)
+        for job in received:
+            self.dispatcher.submit(job)
+        if received or sent or failed:
+            logger.info(f"Recovered {len(received)} unprinted and {len(sent) + len(failed)} unacked job(s)")
+    
+    def _fallback_printer(self, printer_ip: str, printer_port: int) -> Optional[Tuple[str, int]]:
+        """Configured FALLBACK_PRINTER as (host, port), if usable instead of printer_ip"""
+        fallback = self.config['fallback_printer']
+        if not fallback:
+            return None
+        host, _, port = fallback.partition(':')
+        port = int(port or 9100)
+        if (host, port) == (printer_ip, int(printer_port)) or not self._is_private_ip(host):
+            return None
+        if not self.health.check(host, port)[0] or self._breaker(f"{host}:{port}").state == CircuitBreaker.OPEN:
+            return None
+        return host, port
+    
+    def _batch_stream(self, orders: List[Dict], images: List[bytes], bodies: List[Iterable[bytes]],
+                      starts: List[int], ends: List[int]) -> Iterator[bytes]:
+        """ESC/POS stream for several tickets, recording each one's byte range"""
+        offset = 0
+        for order, order_images, body in zip(orders, images, bodies):
+            starts.append(offset)
+            chunks = self._order_chunks(order, images=order_images, body=body)
+            tail = b''
+            for chunk in chunks:
+                offset += len(chunk)
+                tail = (tail + chunk[-8:])[-8:]
+                yield chunk
+            if b'\x1dV' not in tail:
+                # Keep tickets separate even if the payload has no cut of its own
+                offset += len(ESCPOSCommands.CUT)
+                yield ESCPOSCommands.CUT
+            ends.append(offset)
+    
+    def process_batch(self, orders: List[Dict]) -> List[bool]:
+        """Print several jobs for the same direct-IP printer in one transmission
+
+        Tickets are written back to back over one connection with a cut
+        between them. A job whose ticket cannot be built is failed before
+        the printer is taken and the others are sent without it. If the
+        write fails part way, jobs whose bytes were all
+        accepted count as printed and the job being written is failed. Jobs
+        not yet started are printed one at a time if only a payload was bad;
+        if the printer was lost they go to the retry queue with the rest, so
+        one outage counts once against the breaker.
+        """
+        if len(orders) == 1:
+            return [self.process_order(orders[0])]
+        
+        printer_ip = orders[0]['printerIp']
+        printer_port = orders[0].get('printerPort', 9100)
+        breaker = self._breaker(f"{printer_ip}:{printer_port}")
+        if (not self._is_private_ip(printer_ip) or not self.health.check(printer_ip, printer_port)[0]
+                or breaker.state != CircuitBreaker.CLOSED):
+            # The single-job path refuses, reroutes or fails these
+            return [self.process_order(order) for order in orders]
+        statuses = [self._load_print_data(order) for order in orders]
+        if any(status != 200 for status in statuses):
+            results = []
+            for order, status in zip(orders, statuses):
+                if status == 200:
+                    results.append(self.process_order(order))
+                else:
+                    self._print_data_unavailable(order, status)
+                    results.append(False)
+            return results
+        
+        # Built before taking the printer, not between tickets on the wire. A
+        # ticket that cannot be built is the job's fault, not the printer's:
+        # fail it here so it neither breaks the stream nor trips the breaker
+        bodies: List[Optional[Iterable[bytes]]] = []
+        for order in orders:
+            try:
+                bodies.append(self._order_body(order, f"{printer_ip}:{printer_port}"))
+            except Exception as e:
+                logger.error(f"Failed to build ticket for order {order.get('id')}: {e}")
+                if order.get('id'):
+                    self._job_failed(order, f"Processing error: {e}")
+                bodies.append(None)
+        if any(body is None for body in bodies):
+            ready = [i for i, body in enumerate(bodies) if body is not None]
+            results = [False] * len(orders)
+            if ready:
+                for i, result in zip(ready, self.process_batch([orders[i] for i in ready])):
+                    results[i] = result
+            return results
+        images = [self._job_images(order) for order in orders]
+        starts: List[int] = []
+        ends: List[int] = []
+        printer = self.printer_pool.acquire(printer_ip, printer_port)
+        try:
+            connected = printer.connected or printer.connect()
+            if connected:
+                logger.info(f"Sending {len(orders)} coalesced job(s) to {printer_ip}:{printer_port}")
+                for order in orders:
+                    if not order.get('printData'):
+                        self._prepare_printer(printer, order)
+                success = printer.send_chunks(self._batch_stream(orders, images, bodies, starts, ends))
+                written = printer.bytes_written
+                # A failed send that kept the connection means bad data, not a printer fault
+                still_connected = printer.connected
+        finally:
+            self.printer_pool.release(printer)
+        
+        if not connected:
+            logger.error(f"Failed to connect to printer at {printer_ip}:{printer_port}")
+            breaker.record_failure()
+            for order in orders:
+                self._attempt_failed(order, f"Failed to connect to printer at {printer_ip}:{printer_port}")
+            return [False] * len(orders)
+        if success:
+            breaker.record_success()
+            self.health.report(printer_ip, printer_port, True)
+        elif not still_connected:
+            breaker.record_failure()
+        
+        results = []
+        for i, order in enumerate(orders):
+            if i < len(ends) and ends[i] <= written:
+                logger.info(f"Successfully printed order {order.get('id')} to {printer_ip}")
+                if order.get('id'):
+                    self._job_printed(order)
+                results.append(True)
+            elif i < len(starts):
+                logger.error(f"Coalesced write to {printer_ip}:{printer_port} broke during order {order.get('id')} "
+                             f"after {written - starts[i]} byte(s)")
+                if still_connected:
+                    if order.get('id'):
+                        self._job_failed(order, f"Failed to print to {printer_ip}:{printer_port}")
+                else:
+                    self._attempt_failed(order, f"Failed to print to {printer_ip}:{printer_port}")
+                results.append(False)
+            elif still_connected:
+                results.append(self.process_order(order))
+            else:
+                self._attempt_failed(order, f"Failed to print to {printer_ip}:{printer_port}")
+                results.append(False)
+        return results
+    
     def process_order(self, order: Dict) -> bool:
         """Process and print an order"""
+        # Breaker that let this job through, possibly as its half-open trial
+        gate: Optional[CircuitBreaker] = None
         try:
+            status = self._load_print_data(order)
+            if status != 200:
+                self._print_data_unavailable(order, status)
+                return False
+            
             # Direct IP printing (using camelCase field names from crouton-sales API)
             printer_ip = order.get('printerIp')
             if printer_ip:
@@ -317,63 +3191,71 @@ class PrintServer:
                 # Validate IP is in private network range for security
                 if not self._is_private_ip(printer_ip):
                     logger.error(f"Refused to print to non-private IP: {printer_ip}")
+                    if order.get('id'):
+                        self._job_failed(order, f"Refused to print to non-private IP: {printer_ip}")
                     return False
                 
+                available, reason = self.health.check(printer_ip, printer_port)
+                if available:
+                    gate = self._breaker(f"{printer_ip}:{printer_port}")
+                    if not gate.allow():
+                        available, reason = False, 'circuit open'
+                if not available:
+                    fallback = self._fallback_printer(printer_ip, printer_port)
+                    if not fallback:
+                        if reason != 'circuit open':
+                            # Paper out, cover open...: likely fixed soon, so back off and retry
+                            self._attempt_failed(order, f"Printer {printer_ip}:{printer_port} not ready: {reason}")
+                            return False
+                        logger.error(f"Printer {printer_ip}:{printer_port} is not ready ({reason}), "
+                                     f"failing order {order.get('id')}")
+                        if order.get('id'):
+                            self._job_failed(order, f"Printer {printer_ip}:{printer_port} not ready: {reason}")
+                        return False
+                    logger.warning(f"Printer {printer_ip}:{printer_port} is not ready ({reason}), "
+                                   f"rerouting order {order.get('id')} to {fallback[0]}:{fallback[1]}")
+                    printer_ip, printer_port = fallback
+                
+                breaker = self._breaker(f"{printer_ip}:{printer_port}")
                 logger.info(f"Using direct IP printing to {printer_ip}:{printer_port}")
-                printer = SimplePrinter(printer_ip, printer_port)
+                # Fetch and rasterize images before holding the printer
+                images = self._job_images(order)
+                # Reuse the pooled connection for this printer; the pool closes it once idle
+                printer = self.printer_pool.acquire(printer_ip, printer_port)
+                try:
+                    connected = printer.connected or printer.connect()
+                    if connected:
+                        # Use pre-formatted printData if available, otherwise format ourselves
+                        if order.get('printData'):
+                            logger.info(f"Using pre-formatted print data for order {order.get('id')}")
+                        else:
+                            logger.info(f"Formatting order {order.get('id')} for printing")
+                            self._prepare_printer(printer, order)
+                        success = printer.send_chunks(self._order_chunks(order, printer, images))
+                        still_connected = printer.connected
+                finally:
+                    self.printer_pool.release(printer)
                 
-                # Connect, print, and disconnect for direct IP
-                if printer.connect():
-                    # Use pre-formatted printData if available, otherwise format ourselves
-                    if order.get('printData'):
-                        logger.info(f"Using pre-formatted print data for order {order.get('id')}")
-                        success = printer.send_raw_print_data(order['printData'])
-                    else:
-                        logger.info(f"Formatting order {order.get('id')} for printing")
-                        success = printer.print_order(order, self.event_settings)
-                    printer.disconnect()
-                    
+                if connected:
                     if success:
+                        breaker.record_success()
+                        self.health.report(printer_ip, printer_port, True)
                         logger.info(f"Successfully printed order {order.get('id')} to {printer_ip}")
                         if order.get('id'):
-                            # Mark job as complete using new API endpoint
-                            result = self.make_api_request(
-                                f'/api/print-server/jobs/{order["id"]}/complete',
-                                method='POST'
-                            )
-                            if result and not result.get('error'):
-                                logger.info(f"Order {order.get('id')} marked as complete")
-                            else:
-                                error_msg = result.get('message', 'Unknown error') if result else 'No response from API'
-                                logger.error(f"Failed to mark order {order.get('id')} as complete: {error_msg}")
-                    else:
-                        # Mark job as failed with error message
+                            self._job_printed(order)
+                    elif still_connected:
+                        # Still connected: the payload itself was bad, retrying won't help
                         if order.get('id'):
-                            error_msg = f"Failed to print to {printer_ip}:{printer_port}"
-                            result = self.make_api_request(
-                                f'/api/print-server/jobs/{order["id"]}/fail',
-                                method='POST',
-                                data={'errorMessage': error_msg}
-                            )
-                            if result:
-                                logger.info(f"Order {order.get('id')} marked as failed")
-                            else:
-                                logger.warning(f"Failed to mark order {order.get('id')} as failed")
+                            self._job_failed(order, f"Failed to print to {printer_ip}:{printer_port}")
+                    else:
+                        breaker.record_failure()
+                        self._attempt_failed(order, f"Failed to print to {printer_ip}:{printer_port}")
                     return success
                 else:
                     logger.error(f"Failed to connect to printer at {printer_ip}:{printer_port}")
-                    # Mark job as failed with connection error
-                    if order.get('id'):
-                        error_msg = f"Failed to connect to printer at {printer_ip}:{printer_port}"
-                        result = self.make_api_request(
-                            f'/api/print-server/jobs/{order["id"]}/fail',
-                            method='POST',
-                            data={'errorMessage': error_msg}
-                        )
-                        if result:
-                            logger.info(f"Order {order.get('id')} marked as failed")
-                        else:
-                            logger.warning(f"Failed to mark order {order.get('id')} as failed")
+                    # Reachability is tracked by the breaker; health keeps the DLE EOT status
+                    breaker.record_failure()
+                    self._attempt_failed(order, f"Failed to connect to printer at {printer_ip}:{printer_port}")
                     return False
             
             # Option 2: Named printer (existing logic)
@@ -387,50 +3269,33 @@ class PrintServer:
             
             if not printer:
                 logger.error(f"No printer available for order {order.get('id')}")
+                if order.get('id'):
+                    self._job_failed(order, "No printer available")
                 return False
             
-            success = False
-            for attempt in range(self.config['retry_attempts']):
-                # Use pre-formatted printData if available
-                if order.get('printData'):
-                    logger.info(f"Using pre-formatted print data for order {order.get('id')}")
-                    print_success = printer.send_raw_print_data(order['printData'])
-                else:
-                    print_success = printer.print_order(order, self.event_settings)
-                
-                if print_success:
-                    success = True
-                    logger.info(f"Successfully printed order {order.get('id')} on attempt {attempt + 1}")
-                    break
-                else:
-                    logger.warning(f"Print attempt {attempt + 1} failed for order {order.get('id')}")
-                    if attempt < self.config['retry_attempts'] - 1:
-                        time.sleep(self.config['retry_delay'])
+            breaker = gate = self._breaker(f"{printer.host}:{printer.port}")
+            if not breaker.allow():
+                logger.error(f"Printer {printer_name} is failing (circuit open), failing order {order.get('id')}")
+                if order.get('id'):
+                    self._job_failed(order, f"Printer {printer_name} not ready: circuit open")
+                return False
             
-            if order.get('id'):
-                if success:
-                    # Mark job as complete
-                    result = self.make_api_request(
-                        f'/api/print-server/jobs/{order["id"]}/complete',
-                        method='POST'
-                    )
-                    if result and not result.get('error'):
-                        logger.info(f"Order {order.get('id')} marked as complete")
-                    else:
-                        error_msg = result.get('message', 'Unknown error') if result else 'No response from API'
-                        logger.error(f"Failed to mark order {order.get('id')} as complete: {error_msg}")
-                else:
-                    # Mark job as failed
-                    error_msg = f"Failed to print after {self.config['retry_attempts']} attempts"
-                    result = self.make_api_request(
-                        f'/api/print-server/jobs/{order["id"]}/fail',
-                        method='POST',
-                        data={'errorMessage': error_msg}
-                    )
-                    if result:
-                        logger.info(f"Order {order.get('id')} marked as failed")
-                    else:
-                        logger.warning(f"Failed to mark order {order.get('id')} as failed")
+            # Use pre-formatted printData if available
+            if order.get('printData'):
+                logger.info(f"Using pre-formatted print data for order {order.get('id')}")
+            success = printer.send_chunks(self._order_chunks(order))
+            
+            if success:
+                breaker.record_success()
+                logger.info(f"Successfully printed order {order.get('id')} on attempt {order.get('_attempt', 1)}")
+                if order.get('id'):
+                    self._job_printed(order)
+            elif printer.connected:
+                if order.get('id'):
+                    self._job_failed(order, f"Failed to print to printer {printer_name}")
+            else:
+                breaker.record_failure()
+                self._attempt_failed(order, f"Failed to print to printer {printer_name}")
             
             return success
             
@@ -438,23 +3303,22 @@ class PrintServer:
             logger.error(f"Failed to process order {order.get('id')}: {e}")
             # Mark job as failed with exception details
             if order.get('id'):
-                error_msg = f"Processing error: {str(e)}"
-                result = self.make_api_request(
-                    f'/api/print-server/jobs/{order["id"]}/fail',
-                    method='POST',
-                    data={'errorMessage': error_msg}
-                )
-                if result:
-                    logger.info(f"Order {order.get('id')} marked as failed due to exception")
-                else:
-                    logger.warning(f"Failed to mark order {order.get('id')} as failed")
+                self._job_failed(order, f"Processing error: {str(e)}")
             return False
+        finally:
+            if gate is not None:
+                # A bad payload or an exception records no outcome; don't keep the trial
+                gate.release_trial()
     
     def run(self):
         """Main server loop"""
         logger.info("Starting FriendlyPOS Print Server")
         logger.info(f"Configuration: API={self.config['api_url']}, "
-                   f"Poll={self.config['poll_interval']}s")
+                   f"Poll={self.config['poll_interval']}s ({self.config['job_source']}), "
+                   f"Workers={self.config['max_workers']}")
+        if len(self.events) > 1:
+            logger.info(f"Serving {len(self.events)} events ({', '.join(self.events)}), "
+                        f"{'combined' if self._combined_feed else 'staggered'} polling")
         
         if not self.load_printers():
             logger.error("Failed to load printers, exiting")
@@ -463,19 +3327,68 @@ class PrintServer:
         self.load_event_settings()
         
         self.running = True
+        TRACE.open(self.config)
+        if self.config['enable_metrics'] or self.config['enable_health_check']:
+            if METRICS.enabled:
+                self._register_gauges()
+            try:
+                self.monitoring = MonitoringServer(self, self.config['monitoring_bind'],
+                                                   self.config['monitoring_port'],
+                                                   metrics=self.config['enable_metrics'],
+                                                   health=self.config['enable_health_check'])
+                self.monitoring.start()
+            except OSError as e:
+                logger.error(f"Failed to start monitoring endpoint: {e}")
+                self.monitoring = None
+        self.journal.open()
+        self.acks.load()
+        self.acks.start()
+        self.dispatcher.start()
+        self.delayed.start()
+        self.health.start()
+        self.recover_jobs()
+        if self.config['local_intake_port']:
+            self._start_local_intake()
         error_count = 0
         max_errors = 10
+        offline_polls = 0
         
         try:
             while self.running:
                 try:
-                    jobs = self.poll_for_jobs()
+                    poll_started = time.monotonic()
+                    jobs = self.job_source.fetch()
+                    self.last_poll_at = time.time()
+                    if METRICS.enabled:
+                        METRICS.observe('poll_seconds', time.monotonic() - poll_started)
+                        METRICS.inc('jobs_fetched_total', len(jobs))
                     
                     for job in jobs:
-                        self.process_order(job)
+                        self.dispatcher.submit(job)
                     
                     error_count = 0
                     
+                    if not self.api_online:
+                        offline_polls += 1
+                        if offline_polls == 1:
+                            logger.warning("API unreachable, printing continues offline"
+                                           + (" (local intake open)" if self.local_intake else ""))
+                        if not self.config['offline_mode'] and offline_polls >= max_errors:
+                            logger.critical(f"API unreachable for {max_errors} polls, exiting")
+                            break
+                        # Keep printer connections warm while waiting for the uplink
+                        self.printer_pool.keep_warm = True
+                        time.sleep(self._offline_delay(offline_polls))
+                        continue
+                    
+                    if offline_polls:
+                        logger.info(f"API reachable again after {offline_polls} failed poll(s), syncing acks")
+                        offline_polls = 0
+                        self.printer_pool.keep_warm = False
+                        self.acks.wake()
+                    
+                    self.printer_pool.close_idle()
+                    
                 except KeyboardInterrupt:
                     raise
                 except Exception as e:
@@ -487,20 +3400,65 @@ class PrintServer:
                         break
                     
                     time.sleep(self.config['retry_delay'])
+                    continue
                 
-                time.sleep(self.config['poll_interval'])
+                self.job_source.wait(len(jobs))
                 
         except KeyboardInterrupt:
             logger.info("Received interrupt signal, shutting down")
         finally:
             self.shutdown()
     
+    def _start_local_intake(self):
+        """Open the LAN job intake; it needs a LOCAL_INTAKE_KEY of its own"""
+        if not self.config['local_intake_key']:
+            # The intake is plain HTTP on the LAN; never hand the cloud API key to every till
+            logger.error("LOCAL_INTAKE_PORT is set but LOCAL_INTAKE_KEY is empty, local job intake disabled")
+            return
+        if self.config['local_intake_key'] == self.config['api_key']:
+            logger.warning("LOCAL_INTAKE_KEY is the API key; LAN clients should get a key of their own")
+        try:
+            self.local_intake = LocalIntakeServer(self, self.config['local_intake_bind'],
+                                                  self.config['local_intake_port'],
+                                                  self.config['local_intake_key'])
+            self.local_intake.start()
+        except OSError as e:
+            logger.error(f"Failed to start local job intake: {e}")
+            self.local_intake = None
+    
+    def _offline_delay(self, failures: int) -> float:
+        """Exponential backoff with jitter between polls while the API is down"""
+        delay = min(self.config['poll_interval'] * 2 ** min(failures - 1, 10), self.config['offline_backoff_max'])
+        return delay * random.uniform(0.8, 1.0)
+    
     def shutdown(self):
         """Clean shutdown"""
         self.running = False
+        if self.local_intake:
+            self.local_intake.stop()
+        self.health.stop()
+        waiting = self.delayed.stop()
+        if waiting:
+            logger.info(f"{waiting} job(s) waiting to retry will be resumed on next start")
+        self.dispatcher.stop(timeout=30)
+        if self.monitoring:
+            self.monitoring.stop()
+        self.acks.stop()
+        self.journal.close()
+        TRACE.close()
         
         for name, printer in self.printers.items():
             printer.disconnect()
+        for key, stats in self.printer_pool.stats().items():
+            if stats['transfers']:
+                logger.info(f"Printer {key}: {stats['transfers']} transfers, {stats['bytes_sent']} bytes, "
+                            f"{stats['bytes_per_second'] / 1024:.1f} KB/s")
+        self.printer_pool.close_all()
+        
+        stats = self.api.get_stats()
+        self.api.close()
+        logger.info(f"API client: {stats['requests']} requests, {stats['errors']} errors, "
+                    f"{stats['handshakes']} handshakes, avg latency {stats['avg_latency'] * 1000:.0f}ms")
         
         logger.info("Print server shutdown complete")
 
@@ -511,6 +3469,10 @@ def main():
         logger.error("API_KEY not configured. Please set up config.env")
         sys.exit(1)
     
+    if CONFIG['thread_stack_kb']:
+        # Worker, ack and health threads need far less than the default stack
+        threading.stack_size(CONFIG['thread_stack_kb'] * 1024)
+    
     server = PrintServer()
     server.run()
 
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Startup time and steady-state memory of print_server.py
+
+Runs print_server.py as a child process against the fake API and printers
+from fakes.py, once with the default settings and once with
+LOW_FOOTPRINT=1, and reports:
+
+  import      time to import the module and the number of modules loaded
+  startup     time from process spawn to the first jobs poll
+  RSS         resident memory after warmup, peak, at the end, and drift
+              per hour while a steady trickle of jobs is printed
+
+RSS is read from /proc, so the memory part needs Linux (the router or a VM).
+
+Usage:
+    python3 scripts/bench_footprint.py --duration 120 --rate 2
+    python3 scripts/bench_footprint.py --duration 600 -e JOB_SOURCE=longpoll
+"""
+
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeApi, FakePrinter, make_print_data  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SERVER = os.path.join(ROOT, 'print_server.py')
+
+PROFILES = {
+    'default': {},
+    'low': {'LOW_FOOTPRINT': '1'},
+}
+
+
+def server_env(api_url: str, workdir: str, extra_env: Dict[str, str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        'API_URL': api_url,
+        'API_KEY': 'bench',
+        'EVENT_ID': 'bench',
+        'DEV_MODE': '0',
+        'DEBUG_LEVEL': 'WARNING',
+        'LOG_FILE': os.path.join(workdir, 'print_server.log'),
+        'ACK_FILE': os.path.join(workdir, 'acks.jsonl'),
+        'JOURNAL_FILE': os.path.join(workdir, 'journal.jsonl'),
+        'POLL_INTERVAL': '1',
+    })
+    env.update(extra_env)
+    return env
+
+
+def rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure_import(env: Dict[str, str], runs: int) -> Tuple[float, int]:
+    """Median import time in seconds and number of modules loaded"""
+    code = ('import sys, time; t = time.perf_counter(); import print_server; '
+            'print(time.perf_counter() - t, len(sys.modules))')
+    times, modules = [], 0
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                             stdout=subprocess.PIPE, check=True).stdout.split()
+        times.append(float(out[0]))
+        modules = int(out[1])
+    return statistics.median(times), modules
+
+
+def measure_startup(api: FakeApi, env: Dict[str, str], runs: int) -> float:
+    """Median seconds from spawn to the first jobs poll"""
+    times = []
+    for _ in range(runs):
+        polls = api.polls
+        started = time.monotonic()
+        server = subprocess.Popen([sys.executable, SERVER], env=env)
+        while api.polls == polls and server.poll() is None and time.monotonic() - started < 30:
+            time.sleep(0.002)
+        times.append(time.monotonic() - started)
+        stop(server)
+    return statistics.median(times)
+
+
+def stop(server: subprocess.Popen):
+    if server.poll() is None:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def drift_per_hour(samples: List[Tuple[float, int]]) -> float:
+    """Least-squares slope of RSS over time, in KB per hour"""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_r = sum(r for _, r in samples) / len(samples)
+    var = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not var:
+        return 0.0
+    return sum((t - mean_t) * (r - mean_r) for t, r in samples) / var * 3600
+
+
+def measure_steady_state(api: FakeApi, printers: List[FakePrinter], env: Dict[str, str],
+                         args, profile: str) -> Dict[str, float]:
+    server = subprocess.Popen([sys.executable, SERVER], env=env)
+    time.sleep(args.warmup)
+    samples: List[Tuple[float, int]] = []
+    started = time.monotonic()
+    next_job = started
+    n = 0
+    while time.monotonic() - started < args.duration and server.poll() is None:
+        now = time.monotonic()
+        while next_job <= now:
+            job_id = f'{profile}{n}'
+            printer = printers[n % len(printers)]
+            api.add_jobs([{'id': job_id, 'printerIp': printer.host, 'printerPort': printer.port,
+                           'printData': make_print_data(job_id, args.size)}])
+            n += 1
+            next_job += 1.0 / args.rate
+        rss = rss_kb(server.pid)
+        if rss is not None:
+            samples.append((now - started, rss))
+        time.sleep(1.0)
+    stop(server)
+    if not samples:
+        return {'jobs': n}
+    values = [r for _, r in samples]
+    return {
+        'jobs': n,
+        'start': values[0],
+        'peak': max(values),
+        'end': values[-1],
+        'drift': drift_per_hour(samples),
+    }
+
+
+def run(args) -> int:
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    api = FakeApi().start()
+    printers = [FakePrinter().start() for _ in range(args.printers)]
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix='footprint-') as workdir:
+        for profile in args.profile:
+            env = server_env(api.url, workdir, dict(PROFILES[profile], **extra_env))
+            import_time, modules = measure_import(env, args.runs)
+            startup = measure_startup(api, env, args.runs)
+            memory = measure_steady_state(api, printers, env, args, profile) if args.duration else {}
+            results[profile] = (import_time, modules, startup, memory)
+            for name in ('acks.jsonl', 'journal.jsonl'):
+                path = os.path.join(workdir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    print(f"{'profile':<10}{'import':>10}{'modules':>9}{'startup':>10}"
+          f"{'RSS start':>11}{'peak':>9}{'end':>9}{'drift/h':>10}{'jobs':>7}")
+    for profile, (import_time, modules, startup, memory) in results.items():
+        line = f"{profile:<10}{import_time * 1000:>8.1f}ms{modules:>9}{startup * 1000:>8.0f}ms"
+        if 'start' in memory:
+            line += (f"{memory['start'] / 1024:>9.1f}MB{memory['peak'] / 1024:>7.1f}MB"
+                     f"{memory['end'] / 1024:>7.1f}MB{memory['drift']:>8.0f}KB{memory['jobs']:>7}")
+        print(line)
+    if args.duration and not any('start' in m for *_, m in results.values()):
+        print("RSS not available (needs /proc)")
+
+    api.stop()
+    for printer in printers:
+        printer.stop()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help='profile to measure (repeatable, default: all)')
+    parser.add_argument('--runs', type=int, default=5, help='repetitions for import and startup timing')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='seconds of steady-state load per profile (0 to skip)')
+    parser.add_argument('--rate', type=float, default=2.0, help='jobs released per second')
+    parser.add_argument('--size', type=int, default=512, help='ticket size in bytes')
+    parser.add_argument('--printers', type=int, default=2, help='number of fake printers')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds before sampling starts')
+    parser.add_argument('-e', '--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for print_server.py (repeatable)')
+    args = parser.parse_args()
+    args.profile = args.profile or list(PROFILES)
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
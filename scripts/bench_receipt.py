@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: compiled ReceiptTemplate vs. the original per-call print_order formatting
+
+Usage: python3 scripts/bench_receipt.py [iterations]
+"""
+
+import os
+import re
+import sys
+import timeit
+from datetime import datetime
+
+os.environ.setdefault('DEV_MODE', '1')
+os.environ.setdefault('DEBUG_LEVEL', 'WARNING')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from print_server import ESCPOSCommands, ReceiptTemplate  # noqa: E402
+
+SETTINGS = {'event_name': 'Summer Fest', 'header': 'SUMMER FEST - MAIN BAR'}
+
+ORDER = {
+    'id': 'ord_8f2a91',
+    'items': [
+        {'name': 'Pilsner', 'quantity': 2, 'price': 4.5},
+        {'name': 'Gin Tonic', 'quantity': 1, 'price': 9.0, 'notes': 'no ice'},
+        {'name': 'Nachos', 'quantity': 1, 'price': 7.25},
+        {'name': 'Water', 'quantity': 3, 'price': 2.0},
+    ],
+    'total': 31.25,
+    'customer': {'name': 'Sam', 'phone': '+31 6 1234 5678'},
+    'notes': 'Table 12',
+}
+
+
+def legacy_format(order, settings=None):
+    """print_order's byte building as it was before ReceiptTemplate"""
+    data = bytearray()
+    data.extend(ESCPOSCommands.INIT)
+    if settings and settings.get('header'):
+        data.extend(ESCPOSCommands.ALIGN_CENTER)
+        data.extend(ESCPOSCommands.DOUBLE_HEIGHT)
+        data.extend(settings['header'].encode('utf-8'))
+        data.extend(ESCPOSCommands.LINE_FEED * 2)
+    data.extend(ESCPOSCommands.NORMAL_SIZE)
+    data.extend(ESCPOSCommands.ALIGN_CENTER)
+    data.extend(b"ORDER #" + str(order.get('id', 'N/A')).encode('utf-8'))
+    data.extend(ESCPOSCommands.LINE_FEED * 2)
+    data.extend(ESCPOSCommands.ALIGN_LEFT)
+    data.extend(b"-" * 32)
+    data.extend(ESCPOSCommands.LINE_FEED)
+    for item in order.get('items', []):
+        qty = str(item.get('quantity', 1))
+        name = item.get('name', 'Unknown Item')
+        price = f"${item.get('price', 0):.2f}"
+        line = f"{qty}x {name}".ljust(24) + price.rjust(8)
+        data.extend(line.encode('utf-8'))
+        data.extend(ESCPOSCommands.LINE_FEED)
+        if item.get('notes'):
+            data.extend(f"  Note: {item['notes']}".encode('utf-8'))
+            data.extend(ESCPOSCommands.LINE_FEED)
+    data.extend(b"-" * 32)
+    data.extend(ESCPOSCommands.LINE_FEED)
+    total = order.get('total', 0)
+    data.extend(ESCPOSCommands.BOLD_ON)
+    data.extend("TOTAL:".ljust(24).encode('utf-8'))
+    data.extend(f"${total:.2f}".rjust(8).encode('utf-8'))
+    data.extend(ESCPOSCommands.BOLD_OFF)
+    data.extend(ESCPOSCommands.LINE_FEED * 2)
+    customer = order.get('customer', {})
+    if customer.get('name'):
+        data.extend(f"Customer: {customer['name']}".encode('utf-8'))
+        data.extend(ESCPOSCommands.LINE_FEED)
+    if customer.get('phone'):
+        data.extend(f"Phone: {customer['phone']}".encode('utf-8'))
+        data.extend(ESCPOSCommands.LINE_FEED)
+    if order.get('notes'):
+        data.extend(ESCPOSCommands.LINE_FEED)
+        data.extend(b"Notes: " + order['notes'].encode('utf-8'))
+        data.extend(ESCPOSCommands.LINE_FEED)
+    data.extend(ESCPOSCommands.LINE_FEED * 2)
+    data.extend(ESCPOSCommands.ALIGN_CENTER)
+    data.extend(datetime.now().strftime("%Y-%m-%d %H:%M:%S").encode('utf-8'))
+    data.extend(ESCPOSCommands.LINE_FEED * 3)
+    data.extend(ESCPOSCommands.CUT)
+    return bytes(data)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    template = ReceiptTemplate(SETTINGS, width=32)
+
+    timestamp = re.compile(rb'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d')
+    if timestamp.sub(b'', legacy_format(ORDER, SETTINGS)) != timestamp.sub(b'', template.render(ORDER)):
+        print("ERROR: template output differs from legacy print_order output")
+        sys.exit(1)
+
+    legacy = min(timeit.repeat(lambda: legacy_format(ORDER, SETTINGS), number=iterations, repeat=3))
+    compiled = min(timeit.repeat(lambda: template.render(ORDER), number=iterations, repeat=3))
+    compile_cost = min(timeit.repeat(lambda: ReceiptTemplate(SETTINGS, width=32), number=1000, repeat=3)) / 1000
+
+    print(f"Receipts formatted: {iterations} x {len(ORDER['items'])} items")
+    print(f"  legacy print_order:   {legacy / iterations * 1e6:8.2f} us/receipt")
+    print(f"  ReceiptTemplate:      {compiled / iterations * 1e6:8.2f} us/receipt")
+    print(f"  template compile:     {compile_cost * 1e6:8.2f} us (once per settings change)")
+    print(f"  speedup:              {legacy / compiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Fake FriendlyPOS API and fake ESC/POS printers for local benchmarks
+
+FakeApi serves the print-server endpoints used by print_server.py from an
+in-memory job list. FakePrinter listens like a port-9100 printer and records
+when each job's payload has fully arrived.
+"""
+
+import base64
+import gzip
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Every benchmark job payload ends with this marker so printers can tell
+# when a given job has been received in full
+JOB_MARKER = re.compile(rb'\x1b@JOB:([A-Za-z0-9_-]+);')
+
+
+def make_print_data(job_id: str, size: int = 512) -> str:
+    """Base64 ESC/POS payload of roughly size bytes ending in the job marker"""
+    body = b'\x1b@' + (b'Benchmark ticket line\n' * (max(size, 64) // 22))
+    return base64.b64encode(body + b'\x1d\x56\x00' + b'\x1b@JOB:' + job_id.encode() + b';').decode()
+
+
+class FakeApi:
+    """In-memory /api/print-server job queue with optional long-poll and bulk acks
+
+    Images put in `images` (ref -> PNG/PBM/PGM bytes) are served from
+    /api/print-server/images/<ref>, and `settings` from /api/settings.
+    Job lists carry a cursor and an ETag (idle polls repeating it get 304),
+    and include_data=false defers printData to /api/print-server/jobs/<id>/data.
+    Jobs tagged with an eventId are only returned to that event's poll or to
+    the combined /api/print-server/jobs?event_ids=... poll (unless combined
+    is False). With gzip set, replies are compressed for clients that accept
+    it; drop_connections() closes every open keep-alive connection.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, bulk_acks: bool = True,
+                 latency: float = 0.0):
+        self.bulk_acks = bulk_acks
+        self.latency = latency
+        self.pending: List[Dict] = []
+        self.created: Dict[str, float] = {}
+        self.acked: Dict[str, float] = {}
+        self.failed: Dict[str, str] = {}
+        self.images: Dict[str, bytes] = {}
+        self.settings: Dict = {'event_name': 'Benchmark', 'header': 'BENCHMARK'}
+        self.polls = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.version = 0
+        self.combined = True
+        self.gzip = False
+        self.deferred: Dict[str, str] = {}
+        self._connections = set()
+        self._cond = threading.Condition()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.url = 'http://%s:%d' % self._httpd.server_address[:2]
+
+    def add_jobs(self, jobs: List[Dict]):
+        """Make jobs available to the next poll"""
+        now = time.monotonic()
+        with self._cond:
+            for job in jobs:
+                self.created.setdefault(job['id'], now)
+                self.pending.append(job)
+            self.version += 1
+            self._cond.notify_all()
+
+    def take_jobs(self, wait: float = 0.0, include_data: bool = True,
+                  event_id: Optional[str] = None) -> List[Dict]:
+        """Hand out pending jobs, only those tagged with event_id if given"""
+        with self._cond:
+            if not self.pending and wait:
+                self._cond.wait(wait)
+            if event_id is None:
+                jobs, self.pending = self.pending, []
+            else:
+                jobs = [job for job in self.pending if job.get('eventId', event_id) == event_id]
+                self.pending = [job for job in self.pending if job.get('eventId', event_id) != event_id]
+            self.polls += 1
+            if not include_data:
+                deferred = []
+                for job in jobs:
+                    if job.get('printData'):
+                        self.deferred[job['id']] = job['printData']
+                        job = dict(job, hasPrintData=True, printDataSize=len(job['printData']) * 3 // 4)
+                        del job['printData']
+                    deferred.append(job)
+                jobs = deferred
+            return jobs
+
+    def ack(self, job_id: str, status: str, error: str = ''):
+        with self._cond:
+            self.acked.setdefault(job_id, time.monotonic())
+            if status == 'fail':
+                self.failed[job_id] = error
+
+    def drop_connections(self):
+        """Close open connections without telling the client, like an idle timeout"""
+        with self._cond:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with api._cond:
+                    api._connections.add(self.connection)
+
+            def finish(self):
+                with api._cond:
+                    api._connections.discard(self.connection)
+                super().finish()
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, code: int, payload, content_type: str = 'application/json',
+                       etag: Optional[str] = None):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+                compress = api.gzip and 'gzip' in self.headers.get('Accept-Encoding', '')
+                if compress:
+                    body = gzip.compress(body)
+                api.bytes_sent += len(body)
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                if compress:
+                    self.send_header('Content-Encoding', 'gzip')
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                api.requests += 1
+                if api.latency:
+                    time.sleep(api.latency)
+                path, _, query = self.path.partition('?')
+                params = dict(p.partition('=')[::2] for p in query.split('&') if p)
+                if path.rstrip('/') == '/api/print-server/jobs' and api.combined:
+                    # Combined poll for several events; jobs carry their eventId
+                    events = params.get('event_ids', '').replace('%2C', ',').split(',')
+                    jobs = [job for job in api.take_jobs(0, params.get('include_data') != 'false')
+                            if job.get('eventId', events[0]) in events]
+                    self._reply(200, {'jobs': jobs, 'cursor': str(api.version)})
+                elif '/jobs' in path and '/events/' in path:
+                    event_id = path.split('/events/', 1)[1].split('/', 1)[0]
+                    jobs = api.take_jobs(float(params.get('wait') or 0), params.get('include_data') != 'false',
+                                         event_id)
+                    etag = '"%d"' % api.version
+                    if not jobs and self.headers.get('If-None-Match') == etag:
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                    else:
+                        self._reply(200, {'jobs': jobs, 'cursor': str(api.version)}, etag=etag)
+                elif path.startswith('/api/print-server/jobs/') and path.endswith('/data'):
+                    job_id = path.split('/')[-2]
+                    if job_id in api.deferred:
+                        self._reply(200, {'printData': api.deferred.pop(job_id)})
+                    else:
+                        self._reply(404, {'error': 'Not found'})
+                elif path.startswith('/api/settings'):
+                    self._reply(200, api.settings)
+                elif path.startswith('/api/print-server/images/') and path.rsplit('/', 1)[1] in api.images:
+                    self._reply(200, api.images[path.rsplit('/', 1)[1]], 'application/octet-stream')
+                else:
+                    self._reply(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                api.requests += 1
+                if api.latency:
+                    time.sleep(api.latency)
+                length = int(self.headers.get('Content-Length') or 0)
+                data = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                parts = self.path.split('?', 1)[0].rstrip('/').split('/')
+                if parts[-1] == 'ack' and api.bulk_acks:
+                    for ack in data.get('acks', []):
+                        api.ack(ack['id'], ack['status'], ack.get('errorMessage', ''))
+                    self._reply(200, {'success': True})
+                elif parts[-1] in ('complete', 'fail') and len(parts) >= 2:
+                    api.ack(parts[-2], parts[-1], data.get('errorMessage', ''))
+                    self._reply(200, {'success': True})
+                else:
+                    self._reply(404, {'error': 'Not found'})
+
+        return Handler
+
+    def start(self) -> 'FakeApi':
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class FakePrinter:
+    """Port-9100 style printer with configurable latency, drop rate and throughput
+
+    latency delays each accepted connection, drop_rate is the chance that a
+    connection is closed without reading, and throughput caps bytes/second
+    (0 for unlimited). Answers DLE EOT status queries as a ready printer.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 drop_rate: float = 0.0, throughput: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.throughput = throughput
+        self.received: Dict[str, float] = {}
+        self.bytes_received = 0
+        self.connections = 0
+        self.drops = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(16)
+        self.host, self.port = self._sock.getsockname()[:2]
+        self._running = False
+
+    def start(self) -> 'FakePrinter':
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._sock.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        with self._lock:
+            self.connections += 1
+            drop = self._random.random() < self.drop_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if drop:
+            with self._lock:
+                self.drops += 1
+            conn.close()
+            return
+
+        tail = b''
+        with conn:
+            while self._running:
+                try:
+                    data = conn.recv(4096)
+                except OSError:
+                    return
+                if not data:
+                    return
+                if self.throughput:
+                    time.sleep(len(data) / self.throughput)
+                if b'\x10\x04' in data:
+                    # Real-time status query: reply "online, no errors"
+                    conn.sendall(b'\x12' * data.count(b'\x10\x04'))
+                buffer = tail + data
+                now = time.monotonic()
+                with self._lock:
+                    self.bytes_received += len(data)
+                    for match in JOB_MARKER.finditer(buffer):
+                        self.received.setdefault(match.group(1).decode(), now)
+                tail = buffer[-64:]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: print_server.py against a fake API and fake printers
+
+Starts FakeApi and N FakePrinters in this process, runs print_server.py as a
+child process pointed at them, releases scripted job bursts and reports
+ticket latency (job created -> payload fully received by the printer),
+ack latency, throughput and the server's CPU time and peak RSS.
+
+Usage:
+    python3 scripts/loadtest.py --jobs 200 --burst 20 --interval 1 --printers 3
+    python3 scripts/loadtest.py --printer-latency 0.05 --drop-rate 0.05 -e JOB_SOURCE=longpoll
+"""
+
+import argparse
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeApi, FakePrinter, make_print_data  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'print_server.py')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def start_server(api_url: str, workdir: str, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        'API_URL': api_url,
+        'API_KEY': 'loadtest',
+        'EVENT_ID': 'loadtest',
+        'DEV_MODE': '0',
+        'DEBUG_LEVEL': 'WARNING',
+        'LOG_FILE': os.path.join(workdir, 'print_server.log'),
+        'ACK_FILE': os.path.join(workdir, 'acks.jsonl'),
+        'JOURNAL_FILE': os.path.join(workdir, 'journal.jsonl'),
+        'POLL_INTERVAL': '1',
+        'ENABLE_HEALTH_CHECK': '0',
+        'ENABLE_METRICS': '0',
+    })
+    env.update(extra_env)
+    return subprocess.Popen([sys.executable, SERVER], env=env)
+
+
+def run(args) -> int:
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    rng = random.Random(args.seed)
+
+    api = FakeApi(bulk_acks=not args.no_bulk, latency=args.api_latency).start()
+    printers = [
+        FakePrinter(latency=args.printer_latency, drop_rate=args.drop_rate,
+                    throughput=args.throughput, seed=args.seed + i).start()
+        for i in range(args.printers)
+    ]
+
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+        server = start_server(api.url, workdir, extra_env)
+        time.sleep(args.warmup)
+
+        started = time.monotonic()
+        job_printer: Dict[str, FakePrinter] = {}
+        for start in range(0, args.jobs, args.burst):
+            burst = []
+            for n in range(start, min(start + args.burst, args.jobs)):
+                job_id = f"job{n}"
+                printer = printers[rng.randrange(len(printers))]
+                size = args.size if rng.random() > args.large_ratio else args.size * 20
+                burst.append({
+                    'id': job_id,
+                    'printerIp': printer.host,
+                    'printerPort': printer.port,
+                    'printData': make_print_data(job_id, size),
+                })
+                job_printer[job_id] = printer
+            api.add_jobs(burst)
+            time.sleep(args.interval)
+
+        deadline = time.monotonic() + args.timeout
+        while len(api.acked) < args.jobs and time.monotonic() < deadline:
+            if server.poll() is not None:
+                break
+            time.sleep(0.05)
+        finished = time.monotonic()
+
+        if server.poll() is None:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    print_latency = [job_printer[j].received[j] - api.created[j]
+                     for j in job_printer if j in job_printer[j].received]
+    ack_latency = [api.acked[j] - api.created[j] for j in job_printer if j in api.acked]
+    printed = len(print_latency)
+    elapsed = finished - started
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+    print(f"Jobs: {args.jobs} in bursts of {args.burst} every {args.interval}s "
+          f"to {args.printers} printer(s)")
+    print(f"  printed:        {printed}  failed acks: {len(api.failed)}  "
+          f"unacked: {args.jobs - len(api.acked)}  dropped connections: {sum(p.drops for p in printers)}")
+    print(f"  print latency:  p50 {percentile(print_latency, 50) * 1000:.0f}ms  "
+          f"p99 {percentile(print_latency, 99) * 1000:.0f}ms  max {max(print_latency or [0]) * 1000:.0f}ms")
+    print(f"  ack latency:    p50 {percentile(ack_latency, 50) * 1000:.0f}ms  "
+          f"p99 {percentile(ack_latency, 99) * 1000:.0f}ms")
+    print(f"  throughput:     {printed / elapsed if elapsed else 0:.1f} jobs/s over {elapsed:.1f}s")
+    print(f"  API requests:   {api.requests} ({api.polls} polls, {api.bytes_sent / 1024:.0f} KB sent)")
+    print(f"  server CPU:     {usage.ru_utime + usage.ru_stime:.2f}s "
+          f"(user {usage.ru_utime:.2f}s, sys {usage.ru_stime:.2f}s)")
+    print(f"  server RSS:     {rss_mb:.1f} MB peak")
+
+    api.stop()
+    for printer in printers:
+        printer.stop()
+    return 0 if printed == args.jobs else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=100, help='total jobs to release')
+    parser.add_argument('--burst', type=int, default=10, help='jobs released per burst')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between bursts')
+    parser.add_argument('--printers', type=int, default=3, help='number of fake printers')
+    parser.add_argument('--size', type=int, default=512, help='typical ticket size in bytes')
+    parser.add_argument('--large-ratio', type=float, default=0.05,
+                        help='fraction of jobs that are 20x larger (logos, catering orders)')
+    parser.add_argument('--printer-latency', type=float, default=0.0, help='seconds before a printer serves a connection')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='chance a printer drops a connection')
+    parser.add_argument('--throughput', type=int, default=0, help='printer bytes/s limit (0 = unlimited)')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds added to each API request')
+    parser.add_argument('--no-bulk', action='store_true', help='fake API without the bulk ack endpoint')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds to let the server start')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for all acks')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-e', '--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for print_server.py (repeatable)')
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
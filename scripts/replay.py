@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded print_server.py trace against fake printers
+
+Record a trace on the router by setting TRACE_FILE (see config.env.example),
+copy it off, then replay it here. The trace's job stream (ids, target
+printers, payload sizes, priorities) is fed through the fake API into an
+in-process PrintServer with the recorded dispatch settings; every recorded
+printer becomes a fake printer, optionally with the throughput and connect
+latency measured on the night. Payloads are synthetic, of the recorded size.
+
+--speed 1 replays in real time with the recorded job source; any other
+speed (0 = as fast as possible) long-polls so jobs are picked up at once.
+--profile and --sample profile the hot path (taking in polled jobs and
+printing them, not the wait for the API) of the replay; run the same trace
+before and after a dispatch change to compare. Poll latencies are only
+compared when the replay uses the recorded job source.
+
+Usage:
+    python3 scripts/replay.py trace.jsonl
+    python3 scripts/replay.py trace.jsonl --speed 0 --profile replay.prof
+    python3 scripts/replay.py trace.jsonl --speed 10 --sample 5 --sample-out stacks.txt -e MAX_WORKERS=4
+"""
+
+import argparse
+import collections
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fakes import FakeApi, FakePrinter, make_print_data  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def load_trace(path: str) -> List[Dict]:
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A trace cut off mid-line by a crash or the size cap
+                    break
+    return records
+
+
+def printer_timing(records: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Recorded throughput (bytes/s) and median connect latency per printer"""
+    sent = collections.defaultdict(lambda: [0, 0.0])
+    connects = collections.defaultdict(list)
+    for record in records:
+        if record['k'] == 'send' and record.get('ok') and record.get('d'):
+            sent[record['p']][0] += record['b']
+            sent[record['p']][1] += record['d']
+        elif record['k'] == 'conn' and record.get('ok'):
+            connects[record['p']].append(record['d'])
+    timing = {}
+    for key in set(sent) | set(connects):
+        total_bytes, seconds = sent.get(key, (0, 0.0))
+        timing[key] = {
+            'throughput': int(total_bytes / seconds) if seconds and total_bytes else 0,
+            'latency': percentile(connects[key], 50) if connects.get(key) else 0.0,
+        }
+    return timing
+
+
+def config_env(start: Dict, printer_ports: Dict[str, int]) -> Dict[str, str]:
+    """Environment reproducing the recorded dispatch settings"""
+    env = {}
+    for key, value in start.get('config', {}).items():
+        if isinstance(value, bool):
+            value = '1' if value else '0'
+        env[key.upper()] = str(value)
+    if env.get('PRINTER_WEIGHTS'):
+        # Weights are keyed by printer; point them at the fake printers
+        weights = []
+        for item in env['PRINTER_WEIGHTS'].split(','):
+            key, _, weight = item.strip().rpartition('=')
+            if key in printer_ports:
+                weights.append(f"127.0.0.1:{printer_ports[key]}={weight}")
+        env['PRINTER_WEIGHTS'] = ','.join(weights)
+    if start.get('events'):
+        env['EVENT_IDS'] = ','.join(start['events'])
+    return env
+
+
+class HotPathProfiler:
+    """cProfile around selected methods, one profiler per thread
+
+    Wrapped methods may call each other (process_batch falls back to
+    process_order); only the outermost call switches the profiler.
+    """
+
+    # Work done per job, without the long-poll wait inside poll_for_jobs
+    METHODS = ('_accept_jobs', 'process_order', 'process_batch')
+
+    def __init__(self):
+        self.profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        import cProfile
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(self._local, 'depth', 0):
+                return func(*args, **kwargs)
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self.profiles.append(profile)
+            self._local.depth = 1
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._local.depth = 0
+        return wrapper
+
+    def dump(self, path: str, top: int):
+        import pstats
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            print("No profile data collected")
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        print(f"\nProfile of the hot path written to {path}; top {top} by cumulative time:")
+        stats.sort_stats('cumulative').print_stats(top)
+
+
+class StackSampler:
+    """Samples thread stacks running print_server.py code every interval seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.samples = 0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own = {threading.get_ident(), threading.main_thread().ident}
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident in own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                # Skip the fake API and printer threads
+                if any(name.startswith('print_server.py:') for name in stack):
+                    self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def report(self, path: str, top: int):
+        if path:
+            with open(path, 'w') as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            print(f"\nFolded stacks ({self.samples} samples) written to {path}")
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        print(f"\nTop {top} sampled frames (server threads, including idle waits):")
+        for leaf, count in leaves.most_common(top):
+            print(f"  {count * 100.0 / total:5.1f}%  {leaf}")
+
+
+def job_from_summary(summary: Dict, job_id: str, printers: Dict[str, FakePrinter]) -> Dict:
+    printer = printers[summary['p']]
+    job = {'id': job_id, 'printerIp': printer.host, 'printerPort': printer.port}
+    if 'items' in summary:
+        job['items'] = [{'name': f'Item {i}', 'quantity': 1, 'price': 1.0} for i in range(summary['items'])]
+        job['total'] = float(summary['items'])
+    else:
+        job['printData'] = make_print_data(job_id, summary.get('b') or 512)
+    for key in ('priority', 'station', 'eventId'):
+        if key in summary:
+            job[key] = summary[key]
+    return job
+
+
+def summarize(records: List[Dict]) -> Dict[str, List[float]]:
+    return {
+        'job': [r['d'] for r in records if r['k'] == 'job' and r.get('ok')],
+        'send': [r['d'] for r in records if r['k'] == 'send' and r.get('ok')],
+        'poll': [r['d'] for r in records if r['k'] == 'poll'],
+    }
+
+
+def run(args) -> int:
+    records = load_trace(args.trace)
+    start = next((r for r in records if r['k'] == 'start'), {})
+    arrivals = [r for r in records if r['k'] in ('poll', 'local') and r.get('jobs')]
+    if not arrivals:
+        print("Trace contains no jobs")
+        return 1
+
+    timing = printer_timing(records) if args.printer_timing else {}
+    printers: Dict[str, FakePrinter] = {}
+    for record in arrivals:
+        for summary in record['jobs']:
+            key = summary['p']
+            if key not in printers:
+                recorded = timing.get(key, {})
+                printers[key] = FakePrinter(latency=recorded.get('latency', 0.0),
+                                            throughput=recorded.get('throughput', 0)).start()
+
+    api = FakeApi().start()
+    workdir = tempfile.mkdtemp(prefix='replay-')
+    replay_trace = os.path.join(workdir, 'trace.jsonl')
+    env = config_env(start, {key: printer.port for key, printer in printers.items()})
+    env.update({
+        'API_URL': api.url,
+        'API_KEY': 'replay',
+        'EVENT_ID': 'replay',
+        'DEV_MODE': '0',
+        'DEBUG_LEVEL': 'WARNING',
+        'LOG_FILE': os.path.join(workdir, 'print_server.log'),
+        'ACK_FILE': os.path.join(workdir, 'acks.jsonl'),
+        'JOURNAL_FILE': os.path.join(workdir, 'journal.jsonl'),
+        'IMAGE_CACHE_DIR': os.path.join(workdir, 'images'),
+        'TRACE_FILE': replay_trace,
+        'TRACE_MAX_BYTES': '0',
+        'HEALTH_CHECK_INTERVAL': '0',
+        'ENABLE_HEALTH_CHECK': '0',
+        'ENABLE_METRICS': '0',
+    })
+    if args.speed != 1:
+        env.update({'JOB_SOURCE': 'longpoll', 'LONG_POLL_TIMEOUT': '2'})
+    env.update(dict(item.split('=', 1) for item in args.env))
+    os.environ.update(env)
+
+    import print_server  # noqa: E402 - configured from the environment above
+
+    profiler = HotPathProfiler() if args.profile else None
+    if profiler:
+        for name in profiler.METHODS:
+            setattr(print_server.PrintServer, name, profiler.wrap(getattr(print_server.PrintServer, name)))
+    sampler = StackSampler(args.sample / 1000.0) if args.sample else None
+
+    server = print_server.PrintServer()
+    thread = threading.Thread(target=server.run, name='print-server', daemon=True)
+    thread.start()
+    time.sleep(args.warmup)
+    if sampler:
+        sampler.start()
+
+    job_ids: List[str] = []
+    seen: Dict[str, str] = {}
+    first = arrivals[0]['t']
+    started = time.monotonic()
+    for record in arrivals:
+        if args.speed > 0:
+            delay = (record['t'] - first) / args.speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            # As fast as possible, but one recorded poll at a time
+            while api.pending:
+                time.sleep(0.001)
+        jobs = []
+        for summary in record['jobs']:
+            # Replay ids must be marker-safe; repeated ids stay repeated
+            original = str(summary.get('id'))
+            if original not in seen:
+                seen[original] = f"r{len(seen)}"
+                job_ids.append(seen[original])
+            jobs.append(job_from_summary(summary, seen[original], printers))
+        if record['k'] == 'local':
+            server.submit_local_jobs(jobs)
+        else:
+            api.add_jobs(jobs)
+
+    deadline = time.monotonic() + args.timeout
+    local_ids = {seen[str(s.get('id'))] for r in arrivals if r['k'] == 'local' for s in r['jobs']}
+    while time.monotonic() < deadline:
+        done = len(api.acked) + sum(1 for job_id in local_ids if server.journal.seen(job_id))
+        if done >= len(job_ids) or not thread.is_alive():
+            break
+        time.sleep(0.02)
+    elapsed = time.monotonic() - started
+
+    if sampler:
+        sampler.stop()
+    server.running = False
+    thread.join(timeout=60)
+
+    recorded = summarize(records)
+    replayed = summarize(load_trace(replay_trace))
+    recorded_span = arrivals[-1]['t'] - first
+    print(f"Replayed {len(job_ids)} jobs from {len(arrivals)} recorded arrivals over {recorded_span:.1f}s "
+          f"to {len(printers)} printer(s) at {'max' if args.speed <= 0 else f'{args.speed:g}x'} speed"
+          f"{' with recorded printer timing' if args.printer_timing else ''}")
+    print(f"  finished:       {len(api.acked)} acked, {len(api.failed)} failed, elapsed {elapsed:.2f}s")
+    recorded_source = str(start.get('config', {}).get('job_source', 'poll'))
+    replay_source = print_server.CONFIG['job_source']
+    for name in ('job', 'send', 'poll'):
+        if name == 'poll' and recorded_source != replay_source:
+            # A long-poll holds the request open, so its latency says nothing about plain polls
+            print(f"  {'poll seconds:':<15} not compared (recorded with {recorded_source}, "
+                  f"replayed with {replay_source})")
+            continue
+        print(f"  {name + ' seconds:':<15} recorded p50 {percentile(recorded[name], 50) * 1000:7.1f}ms "
+              f"p99 {percentile(recorded[name], 99) * 1000:7.1f}ms | replay p50 "
+              f"{percentile(replayed[name], 50) * 1000:7.1f}ms p99 {percentile(replayed[name], 99) * 1000:7.1f}ms")
+
+    if profiler:
+        profiler.dump(args.profile, args.top)
+    if sampler:
+        sampler.report(args.sample_out, args.top)
+
+    api.stop()
+    for printer in printers.values():
+        printer.stop()
+    return 0 if len(api.acked) + len(local_ids) >= len(job_ids) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='trace file recorded with TRACE_FILE')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed factor, 0 for as fast as possible (default: real time)')
+    parser.add_argument('--printer-timing', action='store_true',
+                        help='give fake printers the recorded throughput and connect latency')
+    parser.add_argument('--profile', metavar='FILE', help='cProfile the hot path and write pstats to FILE')
+    parser.add_argument('--sample', type=float, metavar='MS', default=0,
+                        help='sample thread stacks every MS milliseconds')
+    parser.add_argument('--sample-out', metavar='FILE', default='',
+                        help='write sampled stacks in folded format (for flame graphs)')
+    parser.add_argument('--top', type=int, default=20, help='rows to show from profiles')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds to let the server start')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for jobs to finish')
+    parser.add_argument('-e', '--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='override print_server.py settings (repeatable)')
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
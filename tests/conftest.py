@@ -0,0 +1,98 @@
+"""
+Shared fixtures for the print_server.py tests
+
+print_server.py reads its configuration from the environment at import
+time, so it is pointed at a scratch directory here before any test imports
+it. Tests change settings per server through the make_server fixture.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+_WORKDIR = tempfile.mkdtemp(prefix='print-server-tests-')
+os.environ.update({
+    'API_URL': 'http://127.0.0.1:9',
+    'API_KEY': 'test',
+    'EVENT_ID': 'test',
+    'DEV_MODE': '1',
+    'DEBUG_LEVEL': 'WARNING',
+    'LOG_FILE': os.path.join(_WORKDIR, 'print_server.log'),
+    'ACK_FILE': os.path.join(_WORKDIR, 'acks.jsonl'),
+    'JOURNAL_FILE': os.path.join(_WORKDIR, 'journal.jsonl'),
+    'IMAGE_CACHE_DIR': os.path.join(_WORKDIR, 'images'),
+    'ENABLE_HEALTH_CHECK': '0',
+    'ENABLE_METRICS': '0',
+    'TRACE_FILE': '',
+})
+
+import print_server  # noqa: E402
+from fakes import FakeApi, FakePrinter  # noqa: E402
+
+
+@pytest.fixture
+def fake_api():
+    api = FakeApi().start()
+    yield api
+    api.stop()
+
+
+@pytest.fixture
+def printer():
+    fake = FakePrinter().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def wait_for():
+    """Poll a condition until it holds or timeout seconds pass"""
+    def wait(condition, timeout: float = 2.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+    return wait
+
+
+@pytest.fixture
+def refused_port():
+    """A local port with nothing listening on it"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.fixture
+def make_server(monkeypatch, tmp_path):
+    """PrintServer factory: keyword arguments override CONFIG entries"""
+    servers = []
+
+    def make(**config):
+        monkeypatch.setitem(print_server.CONFIG, 'journal_file', str(tmp_path / 'journal.jsonl'))
+        monkeypatch.setitem(print_server.CONFIG, 'ack_file', str(tmp_path / 'acks.jsonl'))
+        for key, value in config.items():
+            assert key in print_server.CONFIG, key
+            monkeypatch.setitem(print_server.CONFIG, key, value)
+        server = print_server.PrintServer()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.delayed.stop()
+        server.printer_pool.close_all()
+        server.journal.close()
+        server.api.close()
@@ -0,0 +1,115 @@
+import json
+import time
+
+from fakes import FakeApi
+from print_server import AckQueue
+
+
+def read_acks(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line)['id'] for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def test_acks_persist_until_delivered(make_server, refused_port, tmp_path):
+    server = make_server(api_url=f'http://127.0.0.1:{refused_port}')
+    server.acks.complete('a')
+    server.acks.fail('b', 'Paper out')
+    assert not server.acks.flush()
+    assert read_acks(server.acks.path) == ['a', 'b']
+
+    reloaded = AckQueue(server, server.acks.path)
+    assert reloaded.load() == 2
+    assert reloaded.pending_ids() == {'a', 'b'}
+
+
+def test_bulk_delivery_clears_file(make_server, fake_api):
+    server = make_server(api_url=fake_api.url)
+    delivered = []
+    server.acks.on_delivered = delivered.append
+    server.acks.complete('a')
+    server.acks.fail('b', 'Paper out')
+    assert server.acks.flush()
+    assert server.acks.bulk_supported is True
+    assert set(fake_api.acked) == {'a', 'b'}
+    assert fake_api.failed == {'b': 'Paper out'}
+    assert [ack['id'] for ack in delivered] == ['a', 'b']
+    assert server.acks.pending() == 0
+    assert read_acks(server.acks.path) == []
+
+
+def test_single_acks_without_bulk_endpoint(make_server):
+    api = FakeApi(bulk_acks=False).start()
+    try:
+        server = make_server(api_url=api.url)
+        server.acks.complete('a')
+        server.acks.complete('b')
+        assert server.acks.flush()
+        assert server.acks.bulk_supported is False
+        assert set(api.acked) == {'a', 'b'}
+    finally:
+        api.stop()
+
+
+def test_ack_queued_during_rewrite_is_kept(make_server, fake_api):
+    server = make_server(api_url=fake_api.url)
+    acks = server.acks
+    real_lock = acks._file_lock
+
+    class LateAckLock:
+        """Queues one more ack right before the rewrite takes the file lock"""
+        injected = False
+
+        def __enter__(self):
+            if not LateAckLock.injected:
+                LateAckLock.injected = True
+                acks.complete('late')
+            return real_lock.__enter__()
+
+        def __exit__(self, *exc):
+            return real_lock.__exit__(*exc)
+
+    acks.complete('a')
+    assert acks._deliver(list(acks._pending)) == 1
+    with acks._cond:
+        acks._pending = []
+    acks._file_lock = LateAckLock()
+    acks._rewrite_file()
+    assert LateAckLock.injected
+    assert acks.pending_ids() == {'late'}
+    assert read_acks(acks.path) == ['late']
+
+
+def test_full_batch_backs_off_while_api_is_down(make_server, refused_port):
+    server = make_server(api_url=f'http://127.0.0.1:{refused_port}')
+    acks = AckQueue(server, server.acks.path, batch_size=2, flush_interval=0.05)
+    attempts = []
+    real_flush = acks.flush
+
+    def counting_flush():
+        attempts.append(time.monotonic())
+        return real_flush()
+
+    acks.flush = counting_flush
+    for job_id in ('a', 'b', 'c'):
+        acks.complete(job_id)
+    acks.start()
+    time.sleep(1.5)
+    made = len(attempts)
+    acks.stop()
+    # The first retry waits 2s, so a full batch gets one attempt in that time
+    assert made == 1
+    assert acks.pending_ids() == {'a', 'b', 'c'}
+
+
+def test_load_skips_torn_line(make_server):
+    server = make_server()
+    with open(server.acks.path, 'w') as f:
+        f.write(json.dumps({'id': 'a', 'status': 'complete'}) + '\n')
+        f.write(json.dumps({'id': 'b', 'status': 'fail', 'errorMessage': 'Paper out'}) + '\n')
+        f.write('{"id": "c", "sta')
+    reloaded = AckQueue(server, server.acks.path)
+    assert reloaded.load() == 2
+    assert reloaded.pending_ids() == {'a', 'b'}
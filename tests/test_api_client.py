@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from print_server import ApiClient
+
+
+def test_keep_alive_reuses_one_connection(fake_api):
+    client = ApiClient(fake_api.url)
+    for _ in range(3):
+        status, _, _ = client.request('GET', '/api/settings')
+        assert status == 200
+    stats = client.get_stats()
+    assert stats['handshakes'] == 1
+    assert stats['requests'] == 3
+    assert stats['reconnects'] == 0
+    client.close()
+
+
+def test_stale_keep_alive_connection_is_reopened(fake_api, wait_for):
+    client = ApiClient(fake_api.url)
+    assert client.request('GET', '/api/settings')[0] == 200
+    fake_api.drop_connections()
+    assert wait_for(lambda: not fake_api._connections)
+
+    status, _, payload = client.request('GET', '/api/settings')
+    assert status == 200
+    assert b'BENCHMARK' in payload
+    stats = client.get_stats()
+    assert stats['handshakes'] == 2
+    assert stats['reconnects'] == 1
+    assert stats['errors'] == 0
+    client.close()
+
+
+def test_gzip_response_is_decoded(fake_api):
+    fake_api.gzip = True
+    fake_api.settings['footer'] = 'Thank you for your order! ' * 40
+    client = ApiClient(fake_api.url)
+    status, headers, payload = client.request('GET', '/api/settings')
+    assert status == 200
+    assert headers['content-encoding'] == 'gzip'
+    assert json.loads(payload)['footer'] == fake_api.settings['footer']
+    assert fake_api.bytes_sent < len(payload)
+    client.close()
+
+
+def test_connect_failure_counts_as_failed_request(refused_port):
+    client = ApiClient(f'http://127.0.0.1:{refused_port}', connect_timeout=1)
+    with pytest.raises(OSError):
+        client.request('GET', '/api/settings')
+    stats = client.get_stats()
+    assert stats['requests'] == 1
+    assert stats['errors'] == 1
+    assert stats['handshakes'] == 0
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from fakes import make_print_data
+from print_server import CircuitBreaker
+
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()['trips'] == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_one_trial():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_doubles_timeout():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05, max_timeout=0.08)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.03)
+    # Capped at max_timeout
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_release_trial_lets_next_job_try():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_release_trial_only_by_the_trial_thread():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    other = threading.Thread(target=breaker.release_trial)
+    other.start()
+    other.join()
+    assert not breaker.allow()
+
+
+def test_bad_payload_does_not_keep_half_open_trial(make_server, printer):
+    server = make_server(breaker_failures=1, breaker_reset=0.05)
+    breaker = server._breaker(f"{printer.host}:{printer.port}")
+    trip(breaker)
+    time.sleep(0.1)
+
+    bad = {'id': 'bad', 'printerIp': printer.host, 'printerPort': printer.port, 'printData': 'QUJD$$$$A'}
+    assert not server.process_order(bad)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    good = {'id': 'good', 'printerIp': printer.host, 'printerPort': printer.port,
+            'printData': make_print_data('good')}
+    assert server.process_order(good)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_exception_does_not_keep_half_open_trial(make_server, printer, monkeypatch):
+    server = make_server(breaker_failures=1, breaker_reset=0.05)
+    breaker = server._breaker(f"{printer.host}:{printer.port}")
+    trip(breaker)
+    time.sleep(0.1)
+
+    def broken(order, printer=None, images=None):
+        raise RuntimeError('render failed')
+
+    monkeypatch.setattr(server, '_order_chunks', broken)
+    order = {'id': 'boom', 'printerIp': printer.host, 'printerPort': printer.port, 'items': []}
+    assert not server.process_order(order)
+    assert breaker.allow()
@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def load_config(**env):
+    """CONFIG as a fresh interpreter reads it from this environment"""
+    code = ("import json, print_server; c = print_server.CONFIG; "
+            "print(json.dumps([c['max_workers'], c['thread_stack_kb'], c['journal_max_acked']]))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=dict(os.environ, **env),
+                         stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(out)
+
+
+@pytest.mark.parametrize('low, expected', [('0', [3, 0, 5000]), ('1', [1, 256, 1000])])
+def test_empty_values_take_the_profile_default(low, expected):
+    # config.env.example leaves these empty and run_dev.sh exports it as is
+    env = {'LOW_FOOTPRINT': low, 'MAX_WORKERS': '', 'THREAD_STACK_KB': '', 'JOURNAL_MAX_ACKED': ''}
+    assert load_config(**env) == expected
+
+
+def test_explicit_values_override_the_profile():
+    env = {'LOW_FOOTPRINT': '1', 'MAX_WORKERS': '2', 'THREAD_STACK_KB': '0', 'JOURNAL_MAX_ACKED': '200'}
+    assert load_config(**env) == [2, 0, 200]
@@ -0,0 +1,51 @@
+import pytest
+
+from fakes import make_print_data
+from print_server import RasterImage
+
+
+def test_pbm_round_trip_and_raster_command():
+    pbm = b'P4\n16 2\n' + bytes([0xff, 0x00, 0x0f, 0xf0])
+    image = RasterImage.from_pbm(pbm, 'logo')
+    assert (image.width, image.height) == (16, 2)
+    assert image.to_pbm() == pbm
+    assert image.escpos() == b'\x1dv0\x00\x02\x00\x02\x00' + bytes([0xff, 0x00, 0x0f, 0xf0])
+
+
+def test_truncated_pbm_is_rejected():
+    with pytest.raises(ValueError):
+        RasterImage.from_pbm(b'P4\n16 2\n\xff')
+
+
+@pytest.fixture
+def image_server(make_server, fake_api, printer, monkeypatch):
+    """Server whose image fetches record whether the printer was held"""
+    server = make_server(api_url=fake_api.url)
+    fake_api.images['logo'] = b'P4\n8 1\n\xaa'
+    held = []
+    fetch = server.images.get
+
+    def get(ref, max_width):
+        lock = server.printer_pool._locks.get((printer.host, printer.port))
+        held.append(lock is not None and lock.locked())
+        return fetch(ref, max_width)
+
+    monkeypatch.setattr(server.images, 'get', get)
+    return server, held
+
+
+def job(job_id, printer):
+    return {'id': job_id, 'printerIp': printer.host, 'printerPort': printer.port,
+            'printData': make_print_data(job_id), 'images': ['logo']}
+
+
+def test_images_resolved_before_taking_printer(image_server, printer):
+    server, held = image_server
+    assert server.process_order(job('one', printer))
+    assert held == [False]
+
+
+def test_batch_images_resolved_before_taking_printer(image_server, printer):
+    server, held = image_server
+    assert server.process_batch([job('a', printer), job('b', printer)]) == [True, True]
+    assert held == [False, False]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from fakes import make_print_data
+from print_server import AdaptivePollJobSource, LongPollJobSource, PollJobSource
+
+
+def jobs_for(printer, *job_ids):
+    return [{'id': job_id, 'printerIp': printer.host, 'printerPort': printer.port,
+             'printData': make_print_data(job_id)} for job_id in job_ids]
+
+
+@pytest.mark.parametrize('source, source_class', [
+    ('poll', PollJobSource),
+    ('adaptive', AdaptivePollJobSource),
+    ('longpoll', LongPollJobSource),
+    ('bogus', PollJobSource),
+])
+def test_source_selected_by_config(make_server, source, source_class):
+    assert type(make_server(job_source=source).job_source) is source_class
+
+
+def test_poll_fetches_pending_jobs(make_server, fake_api, printer):
+    server = make_server(api_url=fake_api.url, job_source='poll', poll_interval=0.05)
+    fake_api.add_jobs(jobs_for(printer, 'a', 'b'))
+    assert [job['id'] for job in server.job_source.fetch()] == ['a', 'b']
+    assert server.job_source.fetch() == []
+    started = time.monotonic()
+    server.job_source.wait(0)
+    assert time.monotonic() - started >= 0.05
+
+
+def test_adaptive_backs_off_while_idle_and_resets_on_jobs(make_server, fake_api):
+    server = make_server(api_url=fake_api.url, job_source='adaptive',
+                         poll_interval_min=0.01, poll_interval_max=0.02)
+    source = server.job_source
+    assert source.interval == 0.01
+    source.wait(0)
+    assert source.interval == pytest.approx(0.015)
+    source.wait(0)
+    source.wait(0)
+    assert source.interval == 0.02
+    source.wait(3)
+    assert source.interval == 0.01
+
+
+def test_longpoll_returns_as_soon_as_jobs_arrive(make_server, fake_api, printer):
+    server = make_server(api_url=fake_api.url, job_source='longpoll', long_poll_timeout=5)
+    threading.Timer(0.2, fake_api.add_jobs, [jobs_for(printer, 'late')]).start()
+    started = time.monotonic()
+    jobs = server.job_source.fetch()
+    elapsed = time.monotonic() - started
+    assert [job['id'] for job in jobs] == ['late']
+    assert 0.15 < elapsed < 4
+
+
+def test_longpoll_falls_back_when_api_answers_at_once(make_server, fake_api, monkeypatch):
+    server = make_server(api_url=fake_api.url, job_source='longpoll', long_poll_timeout=5, poll_interval=0.05)
+    source = server.job_source
+    slept = []
+    monkeypatch.setattr('print_server.time.sleep', slept.append)
+    source.last_fetch_time = 0.01
+    source.wait(0)
+    assert slept == [0.05]
+    # A request held for most of the timeout needs no extra pause
+    source.last_fetch_time = 4.9
+    source.wait(0)
+    assert slept == [0.05]
+
+
+@pytest.mark.parametrize('source', ['poll', 'adaptive', 'longpoll'])
+def test_jobs_are_printed_and_acked(make_server, fake_api, printer, wait_for, source):
+    server = make_server(api_url=fake_api.url, job_source=source, poll_interval=0.05,
+                         poll_interval_min=0.02, poll_interval_max=0.1, long_poll_timeout=1,
+                         ack_flush_interval=0.05)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        fake_api.add_jobs(jobs_for(printer, 'one', 'two'))
+        assert wait_for(lambda: {'one', 'two'} <= set(printer.received), timeout=5)
+        assert wait_for(lambda: {'one', 'two'} <= set(fake_api.acked), timeout=5)
+        fake_api.add_jobs(jobs_for(printer, 'three'))
+        assert wait_for(lambda: 'three' in fake_api.acked, timeout=5)
+        assert not fake_api.failed
+    finally:
+        server.running = False
+        thread.join(10)
+    assert not thread.is_alive()
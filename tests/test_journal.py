@@ -0,0 +1,114 @@
+from print_server import JobJournal
+
+
+def reopen(journal: JobJournal) -> JobJournal:
+    journal.close()
+    loaded = JobJournal(journal.path, max_acked=journal.max_acked, compact_records=journal.compact_records)
+    loaded.open()
+    return loaded
+
+
+def test_states_survive_restart(tmp_path):
+    journal = JobJournal(str(tmp_path / 'journal.jsonl'))
+    journal.open()
+    journal.record('new', JobJournal.RECEIVED, job={'id': 'new'})
+    journal.record('printed', JobJournal.RECEIVED, job={'id': 'printed'})
+    journal.record('printed', JobJournal.SENT)
+    journal.record('broken', JobJournal.RECEIVED, job={'id': 'broken'})
+    journal.record('broken', JobJournal.FAILED, error='Paper out')
+    journal.record('done', JobJournal.RECEIVED, job={'id': 'done'})
+    journal.record('done', JobJournal.SENT)
+    journal.record('done', JobJournal.ACKED)
+
+    journal = reopen(journal)
+    assert journal.unfinished() == ([{'id': 'new'}], ['printed'], [('broken', 'Paper out')])
+    assert all(journal.seen(job_id) for job_id in ('new', 'printed', 'broken', 'done'))
+    assert not journal.seen('other')
+    journal.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    path.write_text('{"i":"a","s":"r","j":{"id":"a"}}\n{"i":"b","s":')
+    journal = JobJournal(str(path))
+    journal.open()
+    assert journal.unfinished()[0] == [{'id': 'a'}]
+    journal.close()
+
+
+def test_remembers_only_recent_acked_ids(tmp_path):
+    journal = JobJournal(str(tmp_path / 'journal.jsonl'), max_acked=2)
+    journal.open()
+    for job_id in ('a', 'b', 'c'):
+        journal.record(job_id, JobJournal.ACKED)
+    assert not journal.seen('a')
+    assert journal.seen('b') and journal.seen('c')
+    journal.close()
+
+
+def test_compaction_keeps_live_state(tmp_path):
+    journal = JobJournal(str(tmp_path / 'journal.jsonl'), compact_records=5)
+    journal.open()
+    for i in range(4):
+        journal.record(f'job{i}', JobJournal.RECEIVED, job={'id': f'job{i}'})
+        journal.record(f'job{i}', JobJournal.ACKED)
+    journal.record('open', JobJournal.RECEIVED, job={'id': 'open'})
+    with open(journal.path) as f:
+        lines = f.readlines()
+    # 10 records were written; compaction left one line per job
+    assert len(lines) < 10
+    journal = reopen(journal)
+    assert journal.unfinished() == ([{'id': 'open'}], [], [])
+    assert journal.seen('job0')
+    journal.close()
+
+
+def test_recover_jobs_redispatches_and_requeues_acks(make_server):
+    server = make_server()
+    server.journal.open()
+    server.journal.record('unprinted', JobJournal.RECEIVED, job={'id': 'unprinted'})
+    server.journal.record('printed', JobJournal.RECEIVED, job={'id': 'printed'})
+    server.journal.record('printed', JobJournal.SENT)
+    server.journal.record('failed', JobJournal.RECEIVED, job={'id': 'failed'})
+    server.journal.record('failed', JobJournal.FAILED, error='Paper out')
+    submitted = []
+    server.dispatcher.submit = submitted.append
+
+    server.recover_jobs()
+    assert submitted == [{'id': 'unprinted'}]
+    assert server.acks.pending_ids() == {'printed', 'failed'}
+
+
+def test_acked_outcome_survives_compaction(tmp_path):
+    journal = JobJournal(str(tmp_path / 'journal.jsonl'))
+    journal.open()
+    journal.record('printed', JobJournal.ACKED)
+    journal.record('broken', JobJournal.ACKED, error='Paper out')
+    journal = reopen(journal)
+    assert journal.outcome('printed') == (JobJournal.SENT, None)
+    assert journal.outcome('broken') == (JobJournal.FAILED, 'Paper out')
+    assert journal.outcome('other') is None
+    journal.close()
+
+
+def test_finished_job_served_again_is_acked_not_reprinted(make_server, fake_api):
+    server = make_server(api_url=fake_api.url)
+    server.journal.open()
+    printed = {'id': 'printed', 'printerIp': '127.0.0.1'}
+    broken = {'id': 'broken', 'printerIp': '127.0.0.1'}
+    assert server._accept_jobs([printed, broken]) == [printed, broken]
+    server._job_printed(printed)
+    server._job_failed(broken, 'Paper out')
+    assert server.acks.flush()
+    fake_api.acked.clear()
+    fake_api.failed.clear()
+
+    # The acks were lost and the API serves both jobs again
+    assert server._accept_jobs([printed, broken]) == []
+    assert server.acks.pending_ids() == {'printed', 'broken'}
+    # Already queued: a second poll does not add them again
+    assert server._accept_jobs([printed, broken]) == []
+    assert server.acks.pending() == 2
+    assert server.acks.flush()
+    assert set(fake_api.acked) == {'printed', 'broken'}
+    assert fake_api.failed == {'broken': 'Paper out'}
@@ -0,0 +1,45 @@
+from fakes import make_print_data
+
+
+def lazy_job(job_id: str, printer):
+    return {'id': job_id, 'printerIp': printer.host, 'printerPort': printer.port, 'hasPrintData': True}
+
+
+def test_deferred_print_data_is_fetched(make_server, fake_api, printer):
+    server = make_server(api_url=fake_api.url)
+    fake_api.deferred['lazy'] = make_print_data('lazy')
+    assert server.process_order(lazy_job('lazy', printer))
+    assert server.acks.pending_ids() == {'lazy'}
+
+
+def test_missing_print_data_fails_the_job(make_server, fake_api, printer):
+    server = make_server(api_url=fake_api.url)
+    server.delayed.start()
+    assert not server.process_order(lazy_job('gone', printer))
+    assert server.acks.pending_ids() == {'gone'}
+    assert len(server.delayed) == 0
+
+
+def test_server_error_is_retried(make_server, printer, monkeypatch):
+    server = make_server(retry_delay=60)
+    server.delayed.start()
+    monkeypatch.setattr(server, 'api_call', lambda *args, **kwargs: (503, None))
+    order = lazy_job('busy', printer)
+    assert not server.process_order(order)
+    assert server.acks.pending() == 0
+    assert len(server.delayed) == 1
+    assert order['_attempt'] == 2
+
+
+def test_unreachable_api_keeps_job_without_using_attempts(make_server, printer, refused_port):
+    server = make_server(api_url=f'http://127.0.0.1:{refused_port}', retry_delay=60)
+    server.journal.open()
+    server.delayed.start()
+    order = lazy_job('offline', printer)
+    server._accept_jobs([order])
+    assert not server.process_order(order)
+    assert server.acks.pending() == 0
+    assert len(server.delayed) == 1
+    assert '_attempt' not in order
+    received, sent, failed = server.journal.unfinished()
+    assert [job['id'] for job in received] == ['offline']
@@ -0,0 +1,68 @@
+import http.client
+import json
+
+import pytest
+
+from fakes import make_print_data
+
+
+@pytest.fixture
+def intake(make_server):
+    server = make_server(local_intake_bind='127.0.0.1', local_intake_port=0, local_intake_key='till-key')
+    server.journal.open()
+    submitted = []
+    server.dispatcher.submit = submitted.append
+    server._start_local_intake()
+    yield server, submitted
+    server.local_intake.stop()
+
+
+def post(server, body: bytes, headers):
+    host, port = server.local_intake._httpd.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        conn.putrequest('POST', '/jobs')
+        for name, value in headers.items():
+            conn.putheader(name, value)
+        conn.endheaders(body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b'{}')
+    finally:
+        conn.close()
+
+
+def test_accepts_jobs_once(intake):
+    server, submitted = intake
+    body = json.dumps({'jobs': [{'id': 'local1', 'printerIp': '127.0.0.1',
+                                 'printData': make_print_data('local1')}]}).encode()
+    headers = {'X-API-Key': 'till-key', 'Content-Length': str(len(body))}
+    assert post(server, body, headers) == (202, {'accepted': 1, 'duplicates': 0, 'ids': ['local1']})
+    assert post(server, body, headers)[1]['duplicates'] == 1
+    assert [job['id'] for job in submitted] == ['local1']
+
+
+def test_rejects_wrong_key(intake):
+    server, submitted = intake
+    assert post(server, b'{}', {'X-API-Key': 'test', 'Content-Length': '2'})[0] == 401
+    assert not submitted
+
+
+def test_malformed_content_length_is_bad_request(intake):
+    server, _ = intake
+    assert post(server, b'{}', {'X-API-Key': 'till-key', 'Content-Length': 'abc'})[0] == 400
+
+
+def test_intake_needs_its_own_key(make_server):
+    server = make_server(local_intake_bind='127.0.0.1', local_intake_port=0, local_intake_key='')
+    server._start_local_intake()
+    assert server.local_intake is None
+
+
+def test_only_polls_change_online_state(make_server, refused_port):
+    server = make_server(api_url=f'http://127.0.0.1:{refused_port}')
+    server.acks.complete('job')
+    assert not server.acks.flush()
+    assert server.api_call('/api/print-server/jobs/job/data')[0] is None
+    assert server.api_online
+    assert server.poll_for_jobs() == []
+    assert not server.api_online
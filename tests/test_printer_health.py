@@ -0,0 +1,58 @@
+import time
+
+import print_server
+from print_server import PrinterHealthMonitor, PrinterPool
+
+
+def known(pool, host, port):
+    pool.release(pool.acquire(host, port))
+
+
+def test_probe_reads_status_of_idle_printer(printer):
+    pool = PrinterPool()
+    known(pool, printer.host, printer.port)
+    health = PrinterHealthMonitor(pool)
+    status = health.probe(printer.host, printer.port)
+    assert status['ready'] and status['reason'] == ''
+    assert health.check(printer.host, printer.port) == (True, '')
+    # The pooled connection is left as it was
+    pooled = pool.try_acquire(printer.host, printer.port)
+    assert not pooled.connected
+    pool.release(pooled)
+
+
+def test_probe_connects_without_holding_pooled_printer(refused_port, monkeypatch):
+    pool = PrinterPool()
+    known(pool, '127.0.0.1', refused_port)
+    health = PrinterHealthMonitor(pool, ttl=0.05)
+    held = []
+    connect = print_server.SimplePrinter.connect
+
+    def watched(self):
+        held.append(pool._locks[(self.host, self.port)].locked())
+        return connect(self)
+
+    monkeypatch.setattr(print_server.SimplePrinter, 'connect', watched)
+    status = health.probe('127.0.0.1', refused_port)
+    assert held == [False]
+    assert status == dict(status, ready=False, reason='unreachable')
+    assert health.check('127.0.0.1', refused_port) == (False, 'unreachable')
+    time.sleep(0.06)
+    # Stale status no longer blocks jobs
+    assert health.check('127.0.0.1', refused_port) == (True, '')
+
+
+def test_busy_printer_is_not_probed(printer):
+    pool = PrinterPool()
+    busy = pool.acquire(printer.host, printer.port)
+    health = PrinterHealthMonitor(pool)
+    assert health.probe(printer.host, printer.port) is None
+    pool.release(busy)
+
+
+def test_report_marks_printer_ready(refused_port):
+    health = PrinterHealthMonitor(PrinterPool())
+    health.report('127.0.0.1', refused_port, False, 'paper_out')
+    assert health.check('127.0.0.1', refused_port) == (False, 'paper_out')
+    health.report('127.0.0.1', refused_port, True)
+    assert health.check('127.0.0.1', refused_port) == (True, '')
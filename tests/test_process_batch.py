@@ -0,0 +1,56 @@
+import base64
+import time
+
+from fakes import make_print_data
+from print_server import CircuitBreaker, ESCPOSCommands
+
+
+def jobs_for(host: str, port: int, count: int):
+    return [{'id': f'job{i}', 'printerIp': host, 'printerPort': port, 'printData': make_print_data(f'job{i}')}
+            for i in range(count)]
+
+
+def test_batch_prints_every_ticket(make_server, printer):
+    server = make_server()
+    orders = jobs_for(printer.host, printer.port, 4)
+    assert server.process_batch(orders) == [True] * 4
+    assert server.acks.pending_ids() == {order['id'] for order in orders}
+
+
+def test_connect_failure_counts_once_and_retries_every_job(make_server, refused_port):
+    server = make_server(breaker_failures=3, retry_attempts=3, retry_delay=60)
+    server.delayed.start()
+    port = refused_port
+    orders = jobs_for('127.0.0.1', port, 6)
+
+    assert server.process_batch(orders) == [False] * 6
+    breaker = server._breaker(f"127.0.0.1:{port}")
+    assert breaker.failures == 1
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert len(server.delayed) == 6
+    assert server.acks.pending() == 0
+    assert all(order['_attempt'] == 2 for order in orders)
+
+
+def test_bad_payload_in_batch_prints_nothing_of_it(make_server, printer, wait_for):
+    server = make_server()
+    orders = jobs_for(printer.host, printer.port, 3)
+    orders[1]['printData'] = 'QUJD$$$$A'
+    assert server.process_batch(orders) == [True, False, True]
+    # The good tickets end in their job marker, so the batch adds a cut after each
+    good = sum(len(base64.b64decode(orders[i]['printData'])) + len(ESCPOSCommands.CUT) for i in (0, 2))
+    assert wait_for(lambda: printer.bytes_received >= good)
+    time.sleep(0.05)
+    assert printer.bytes_received == good
+
+
+def test_receipt_that_cannot_render_fails_alone(make_server, printer, wait_for):
+    server = make_server(breaker_failures=1)
+    orders = [{'id': f'r{i}', 'printerIp': printer.host, 'printerPort': printer.port,
+               'items': [{'name': 'Coffee', 'price': 2.5}], 'total': 2.5} for i in range(3)]
+    orders[1]['items'][0]['price'] = None
+    assert server.process_batch(orders) == [True, False, True]
+    assert server._breaker(f"{printer.host}:{printer.port}").state == CircuitBreaker.CLOSED
+    assert server.acks.pending_ids() == {'r0', 'r1', 'r2'}
+    assert [ack['status'] for ack in server.acks._pending if ack['id'] == 'r1'] == ['fail']
+    assert wait_for(lambda: printer.connections == 1)
@@ -0,0 +1,60 @@
+import threading
+
+from print_server import DelayQueue
+
+
+def test_delay_queue_releases_jobs_when_due():
+    released = []
+    done = threading.Event()
+
+    def submit(job):
+        released.append(job['id'])
+        if len(released) == 2:
+            done.set()
+
+    queue = DelayQueue(submit)
+    queue.start()
+    queue.add({'id': 'late'}, 0.1)
+    queue.add({'id': 'early'}, 0.02)
+    assert done.wait(2)
+    assert released == ['early', 'late']
+    assert queue.stop() == 0
+
+
+def test_delay_queue_stop_reports_waiting_jobs():
+    queue = DelayQueue(lambda job: None)
+    queue.start()
+    queue.add({'id': 'waiting'}, 60)
+    assert queue.stop() == 1
+
+
+def test_failed_attempt_is_retried(make_server):
+    server = make_server(retry_attempts=3, retry_delay=60)
+    server.delayed.start()
+    order = {'id': 'job', 'printerIp': '127.0.0.1'}
+    server._attempt_failed(order, 'Printer not ready')
+    assert order['_attempt'] == 2
+    assert len(server.delayed) == 1
+    assert server.acks.pending() == 0
+
+
+def test_last_attempt_fails_the_job(make_server):
+    server = make_server(retry_attempts=2, retry_delay=60)
+    server.delayed.start()
+    order = {'id': 'job', 'printerIp': '127.0.0.1', '_attempt': 2}
+    server._attempt_failed(order, 'Printer not ready')
+    assert len(server.delayed) == 0
+    assert server.acks.pending_ids() == {'job'}
+
+
+def test_failure_during_shutdown_leaves_job_in_journal(make_server):
+    server = make_server(retry_attempts=3)
+    server.journal.open()
+    server.delayed.start()
+    order = {'id': 'job', 'printerIp': '127.0.0.1'}
+    server._accept_jobs([order])
+    server.delayed.stop()
+    server._attempt_failed(order, 'Printer not ready')
+    assert server.acks.pending() == 0
+    received, _, failed = server.journal.unfinished()
+    assert [job['id'] for job in received] == ['job'] and not failed
@@ -0,0 +1,69 @@
+import time
+
+from print_server import JobScheduler
+
+
+def job(job_id, **fields):
+    return dict({'id': job_id, 'items': []}, **fields)
+
+
+def drain(scheduler, key=None):
+    order = []
+    while True:
+        if key is None:
+            popped = scheduler.pop()
+            if popped is None:
+                return order
+            order.append(popped[1]['id'])
+        else:
+            popped = scheduler.pop_from(key)
+            if popped is None:
+                return order
+            order.append(popped['id'])
+
+
+def test_classify():
+    scheduler = JobScheduler(station_priorities={'bar': JobScheduler.HIGH}, large_job_bytes=1000)
+    assert scheduler.classify(job('a', priority='HIGH')) == JobScheduler.HIGH
+    assert scheduler.classify(job('b', priority=7)) == JobScheduler.LOW
+    assert scheduler.classify(job('c', station='bar')) == JobScheduler.HIGH
+    assert scheduler.classify(job('d', printData='A' * 2000)) == JobScheduler.LOW
+    assert scheduler.classify(job('e')) == JobScheduler.NORMAL
+
+
+def test_same_printer_by_class_then_arrival():
+    scheduler = JobScheduler(aging=0)
+    scheduler.submit('p', job('n1'))
+    scheduler.submit('p', job('low', priority='low'))
+    scheduler.submit('p', job('n2'))
+    scheduler.submit('p', job('high', priority='high'))
+    assert len(scheduler) == 4
+    assert drain(scheduler, 'p') == ['high', 'n1', 'n2', 'low']
+    assert len(scheduler) == 0 and scheduler.depth() == {}
+
+
+def test_waiting_jobs_age_into_higher_class():
+    scheduler = JobScheduler(aging=0.05)
+    scheduler.submit('p', job('old', priority='low'))
+    time.sleep(0.06)
+    scheduler.submit('p', job('new'))
+    # Aged to normal and queued first, so it goes before the newer normal job
+    assert drain(scheduler, 'p') == ['old', 'new']
+
+
+def test_weighted_fair_share_between_printers():
+    scheduler = JobScheduler(weights={'fast': 2.0}, aging=0)
+    for i in range(4):
+        scheduler.submit('fast', job(f'f{i}'))
+        scheduler.submit('slow', job(f's{i}'))
+    first_six = [scheduler.pop()[0] for _ in range(6)]
+    assert first_six.count('fast') == 4
+
+
+def test_pop_skips_excluded_printers():
+    scheduler = JobScheduler()
+    scheduler.submit('busy', job('a', priority='high'))
+    scheduler.submit('idle', job('b'))
+    assert scheduler.pop(exclude={'busy'}) == ('idle', job('b'))
+    assert scheduler.pop(exclude={'busy'}) is None
+    assert scheduler.depth() == {'busy': 1}
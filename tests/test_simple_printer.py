@@ -0,0 +1,37 @@
+import base64
+import binascii
+
+import pytest
+
+from fakes import make_print_data
+from print_server import SimplePrinter
+
+
+def test_iter_base64_decodes_in_chunks(monkeypatch):
+    monkeypatch.setattr(SimplePrinter, 'DECODE_CHUNK', 8)
+    data = bytes(range(40))
+    encoded = base64.b64encode(data).decode()
+    chunks = list(SimplePrinter.iter_base64(encoded[:20] + '\n' + encoded[20:]))
+    assert len(chunks) > 1
+    assert b''.join(chunks) == data
+
+
+@pytest.mark.parametrize('payload', ['QUJD$$$$A', 'QUJDRA', 'QU=JD', 'QUJD-_==='])
+def test_iter_base64_rejects_bad_payload_up_front(payload):
+    with pytest.raises(binascii.Error):
+        SimplePrinter.iter_base64(payload)
+
+
+def test_bad_payload_sends_nothing(make_server, printer, wait_for):
+    server = make_server()
+    bad = 'A' * 100000 + '$'
+    order = {'id': 'bad', 'printerIp': printer.host, 'printerPort': printer.port,
+             'printData': bad + '=' * (-len(bad) % 4)}
+    assert not server.process_order(order)
+    assert server.acks.pending_ids() == {'bad'}
+
+    good = {'id': 'good', 'printerIp': printer.host, 'printerPort': printer.port,
+            'printData': make_print_data('good')}
+    assert server.process_order(good)
+    assert wait_for(lambda: 'good' in printer.received)
+    assert printer.bytes_received == len(base64.b64decode(good['printData']))